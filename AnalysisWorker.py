@@ -0,0 +1,80 @@
+# Running the heat pump analysis off the Tk main thread
+#
+# AnalysisWorker runs doHeatPumpAnalysis in a thread, with an AnalysisProgress as its status: each status
+# report of the analysis (see HeatPumpAnalysis.showStatus) puts a progress event - the text, the stage, the
+# percent done and the hours of climate data processed - on a queue, which the UI reads from its own thread
+# with after(), so Tk widgets are only touched from the main thread and the UI stays responsive.
+#
+# A cancelled analysis stops at its next status report, raising AnalysisCancelled there; the stages it had
+# not finished run again with the next analysis.
+#
+# The events are (kind, value) tuples:
+#   ('progress', dict(text=, stage=, percent=, hours=))
+#   ('done', results text or message), ('cancelled', None), ('error', exception)
+
+import threading
+import queue
+import traceback
+
+class AnalysisCancelled(Exception):
+    pass
+
+class AnalysisProgress:
+    """status for the analysis methods, reporting progress events on a queue"""
+    def __init__(self):
+        self.events = queue.Queue()
+        self.cancelled = threading.Event()
+        self.stage = None
+        self.percent = 0.
+        self.hours = 0
+
+    def report(self,text,stage=None,percent=None,hours=None):
+        # called from the analysis thread; values not given are those last reported
+        if self.cancelled.is_set():
+            raise AnalysisCancelled()
+        if stage is not None:
+            self.stage = stage
+        if percent is not None:
+            self.percent = percent
+        if hours is not None:
+            self.hours = hours
+        self.events.put(('progress', dict(text=text, stage=self.stage, percent=self.percent, hours=self.hours)))
+
+    def cancel(self):
+        self.cancelled.set()
+
+class AnalysisWorker:
+    def __init__(self, analysis):
+        self.analysis = analysis
+        self.progress = AnalysisProgress()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def run(self):
+        events = self.progress.events
+        try:
+            results = self.analysis.doHeatPumpAnalysis(self.progress)
+            events.put(('done', results))
+        except AnalysisCancelled:
+            print("Analysis cancelled")
+            events.put(('cancelled', None))
+        except Exception as e:
+            traceback.print_exc()
+            events.put(('error', e))
+
+    def cancel(self):
+        self.progress.cancel()
+
+    def running(self):
+        return self.thread.is_alive()
+
+    def poll(self):
+        # the events reported since the last poll, without waiting
+        events = []
+        while True:
+            try:
+                events.append(self.progress.events.get_nowait())
+            except queue.Empty:
+                return events
@@ -0,0 +1,246 @@
+# Hourly outdoor temperature data from the Mesowest station files (Climate Data/KBED-YYYY.csv)
+#
+# Parsing a year of Mesowest data takes most of a second (datetime.strptime on every line), so each
+# station file is converted once to a binary cache file holding the hourly times (int64 seconds since
+# 1970) and temperatures (float64, the values read from the file), which later loads map directly with
+# numpy.  The cache file name carries the size and modification time of the .csv file it was made from,
+# so a changed or replaced .csv file is parsed again and the stale cache file removed.
+#
+# Station years read in a session are also kept in memory (stationYear), so that repeated analyses and
+# the reference years of each analysis do not read the files again.
+#
+# The station files are read as a stream: readings yields the lines of a file one at a time, hourlyChunks
+# turns them into hourly times and temperatures in chunks of fixed size, filling the gaps in the readings by a
+# policy (FILL_POLICIES), and stationChunks gives the chunks of a station year from memory or the cache
+# file.  A consumer of the chunks, such as degreeDayIndex, holds no more than a year of hourly data at once
+# however many years (or stations) it goes over.  The cache files of each policy but hold are kept in a
+# sub-folder of their own.
+
+import os
+import glob
+import datetime
+
+import numpy as np
+
+import RunStats
+
+CACHE_FOLDER = 'cache'      # sub-folder of the climate data folder holding the cache files
+CACHE_DTYPE = np.dtype([('t', '<i8'), ('T', '<f8')])
+
+FILL_POLICIES = ('hold', 'linear', 'flag')     # how the hours of a gap in the readings are filled (see hourlyChunks)
+GAP_HOURS = 3               # readings further apart than this are either side of a gap
+CHUNK_HOURS = 31*24         # hours in each chunk of hourly data
+
+# station years read in this session: (file name, fill policy) -> ((size, modification time), times, temperatures)
+yearStore = {}
+
+# degree days of the complete station years, by station files and base temperatures (see degreeDayIndex)
+degreeDays = {}
+FILLED_HOURS_MAX = 7*24     # a year whose first week of hours all carry the first reading starts later in the year
+
+def readings(filename):
+    # (datetime, temperature) of each reading line of a Mesowest .csv file, the temperature None where the
+    # line has none
+    with open(filename,'r',encoding='latin-1') as lines:
+        for LN, line in enumerate(lines):
+            if LN<8:
+                continue
+            tokens = line.rstrip().split(',')
+            try:
+                datestring = tokens[1]
+                dateTime = datetime.datetime.strptime(datestring[0:-4], "%m/%d/%Y %H:%M")
+            except:     # hit the line past the date lines
+                break
+
+            try:
+                temp = float(tokens[2])
+            except:
+                temp = None
+            yield dateTime, temp
+
+def hourlyChunks(records, year, fill='hold', chunkHours=CHUNK_HOURS):
+    # hourly times (datetime64[s]) and temperatures from Jan 1 of the year up to the last of the readings in
+    # records (see readings), in chunks of up to chunkHours.  Each hour takes the temperature of the first
+    # reading after it, except for the hours of a gap (readings more than GAP_HOURS apart), which are filled
+    # by the policy fill:
+    #   hold    the reading after the gap, as for any other hour; a line without a temperature carries the
+    #           one before it (the rule LoadTempDataRaw always used)
+    #   linear  interpolated in time between the readings either side of the gap
+    #   flag    NaN
+    # linear and flag only count lines with a temperature as readings.
+    if fill not in FILL_POLICIES:
+        raise ValueError("Unknown gap fill policy %r, expected one of %s" % (fill, ", ".join(FILL_POLICIES)))
+    times = np.empty(chunkHours, dtype='datetime64[s]')
+    temps = np.empty(chunkHours)
+    n = 0
+
+    oneHour = datetime.timedelta(hours=1)
+    gapTime = datetime.timedelta(hours=GAP_HOURS)
+    nextHour = datetime.datetime(year,1,1,0,0)
+    temp = None
+    lastTime = lastTemp = None
+    for dateTime, reading in records:
+        if reading is not None:
+            temp = reading
+        elif fill != 'hold':
+            continue
+        if temp is None:
+            continue        # no temperature yet in this file
+
+        gap = fill != 'hold' and lastTime is not None and dateTime - lastTime > gapTime
+        # record hourly data when the next dateTime point is past the nextHour to be recorded
+        while nextHour<dateTime :
+            times[n] = nextHour
+            if not gap:
+                temps[n] = temp
+            elif fill == 'linear':
+                temps[n] = lastTemp + (temp - lastTemp)*((nextHour - lastTime)/(dateTime - lastTime))
+            else:
+                temps[n] = np.nan
+            n += 1
+            if n == chunkHours:
+                yield times, temps
+                times = np.empty(chunkHours, dtype='datetime64[s]')
+                temps = np.empty(chunkHours)
+                n = 0
+            nextHour = nextHour+oneHour
+        lastTime, lastTemp = dateTime, temp
+
+    if n>0:
+        yield times[:n], temps[:n]
+
+def parseStationFile(filename, year, fill='hold'):
+    # read a Mesowest .csv file, returning hourly times (datetime64[s]) and temperatures from
+    # Jan 1 of the year up to the last reading in the file (see hourlyChunks)
+    chunks = list(hourlyChunks(readings(filename), year, fill))
+    if len(chunks)==0:
+        return np.zeros(0, dtype='datetime64[s]'), np.zeros(0)
+    return np.concatenate([t for t, T in chunks]), np.concatenate([T for t, T in chunks])
+
+def cacheFileName(filename, fill='hold'):
+    # cache file for a station file, stamped with the size and modification time of the source
+    folder, name = os.path.split(filename)
+    stat = os.stat(filename)
+    stem = os.path.splitext(name)[0]
+    cacheFolder = os.path.join(folder, CACHE_FOLDER) if fill == 'hold' else os.path.join(folder, CACHE_FOLDER, fill)
+    return os.path.join(cacheFolder, "%s-%d-%d.npy" % (stem, stat.st_size, stat.st_mtime_ns))
+
+def loadStationYear(filename, year, fill='hold'):
+    # hourly times and temperatures for one station file, from the binary cache when it is current
+    cacheFile = cacheFileName(filename, fill)
+    if os.path.exists(cacheFile):
+        try:
+            data = np.load(cacheFile, mmap_mode='r')
+            RunStats.counters['climateCacheFilesRead'] += 1
+            return data['t'].astype('datetime64[s]'), np.array(data['T'])
+        except Exception as e:
+            print("Unable to read climate cache file %s: %s" % (cacheFile, e))
+
+    t, T = parseStationFile(filename, year, fill)
+    RunStats.counters['climateFilesParsed'] += 1
+    saveCache(filename, cacheFile, t, T)
+    return t, T
+
+def storedYear(filename, fill='hold'):
+    # the times and temperatures of a station file kept in memory, if it has not changed since it was read
+    stat = os.stat(filename)
+    stored = yearStore.get((filename, fill))
+    if stored is not None and stored[0] == (stat.st_size, stat.st_mtime_ns):
+        RunStats.counters['climateYearsFromMemory'] += 1
+        return stored[1], stored[2]
+    return None
+
+def stationYear(filename, year, fill='hold'):
+    # hourly times and temperatures for one station file, from memory when the file has been read before
+    # and not changed since.  The arrays are shared (read-only), not copied.
+    stored = storedYear(filename, fill)
+    if stored is not None:
+        return stored
+
+    stat = os.stat(filename)
+    t, T = loadStationYear(filename, year, fill)
+    t.flags.writeable = False
+    T.flags.writeable = False
+    yearStore[(filename, fill)] = ((stat.st_size, stat.st_mtime_ns), t, T)
+    return t, T
+
+def stationChunks(filename, year, fill='hold', chunkHours=CHUNK_HOURS):
+    # hourly times and temperatures for one station file in chunks of up to chunkHours, from memory or the
+    # cache file (made first if need be), without keeping the year in memory
+    stored = storedYear(filename, fill)
+    t, T = stored if stored is not None else loadStationYear(filename, year, fill)
+    for i in range(0, len(t), chunkHours):
+        yield t[i:i+chunkHours], T[i:i+chunkHours]
+
+def saveCache(filename, cacheFile, t, T):
+    folder = os.path.dirname(cacheFile)
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    try:
+        os.makedirs(folder, exist_ok=True)
+        # remove cache files made from earlier versions of the station file
+        for old in glob.glob(os.path.join(folder, glob.escape(stem) + '-*-*.npy')):
+            os.remove(old)
+
+        data = np.empty(len(t), dtype=CACHE_DTYPE)
+        data['t'] = t.astype('int64')
+        data['T'] = T
+        # write to a temporary file first so that a partly written cache file is never read
+        tmpFile = cacheFile + '.%d.tmp' % os.getpid()
+        with open(tmpFile, 'wb') as output:
+            np.save(output, data)
+        os.replace(tmpFile, cacheFile)
+    except OSError as e:
+        print("Unable to write climate cache file %s: %s" % (cacheFile, e))
+
+def prepareCache(folder, station='KBED', fill='hold'):
+    # make the cache file for every station file in the climate data folder which does not have a current one
+    for year, filename in stationYears(folder, station):
+        if not os.path.exists(cacheFileName(filename, fill)):
+            print("Reading "+filename)
+            loadStationYear(filename, year, fill)
+
+def stationFingerprint(folder, station='KBED'):
+    # names, sizes and modification times of the station files, which change when any file is replaced or added
+    fingerprint = []
+    for filename in sorted(glob.glob(os.path.join(glob.escape(folder), station + '-*.csv'))):
+        stat = os.stat(filename)
+        fingerprint.append((os.path.basename(filename), stat.st_size, stat.st_mtime_ns))
+    return fingerprint
+
+def stationYears(folder, station='KBED'):
+    # (year, file name) of the station files in the climate data folder
+    years = []
+    for filename in sorted(glob.glob(os.path.join(glob.escape(folder), station + '-*.csv'))):
+        try:
+            years.append((int(os.path.splitext(os.path.basename(filename))[0][len(station)+1:]), filename))
+        except ValueError:
+            continue
+    return years
+
+def degreeDayIndex(folder, heatingBase, coolingBase, station='KBED', fill='hold'):
+    # Heating and cooling degree days (F-days, from the hourly temperatures) of each complete station year,
+    # {year: (HDD, CDD)}, for the given base temperatures.  The index is made once for the station files
+    # present and the base temperatures, a chunk of hours at a time (hours flagged as missing are left out),
+    # and made again when a file is added or changed.
+    key = (tuple(stationFingerprint(folder, station)), heatingBase, coolingBase, fill)
+    index = degreeDays.get(key)
+    if index is None:
+        index = {}
+        for year, filename in stationYears(folder, station):
+            hours = 0
+            first = firstChange = None
+            HDD = CDD = 0.
+            for t, T in stationChunks(filename, year, fill):
+                if first is None:
+                    first = T[0]
+                if firstChange is None and np.any(T != first):
+                    firstChange = hours + np.argmax(T != first)
+                HDD += np.nansum(np.maximum(heatingBase - T, 0.))
+                CDD += np.nansum(np.maximum(T - coolingBase, 0.))
+                hours += len(T)
+            # only years recorded from the start of January to the end of December
+            if hours < 364*24 or (firstChange or 0) > FILLED_HOURS_MAX:
+                continue
+            index[year] = (float(HDD/24.), float(CDD/24.))
+        degreeDays[key] = index
+    return index
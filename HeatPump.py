@@ -1,33 +1,98 @@
 
 # 7/19/17 BHN:  Updated to ColdClimateAir=SourceHeatPumpSpecificationListing 7.14.17
 
+import operator
+
+import numpy as np
+
+import RunStats
+
+def interpolateCurve(tData, values, temps):
+    # whole-array version of the HeatPump interpolation methods (MaxCapacity etc.):
+    # hold the first (47 deg) value above tData[0], the coldest value at or below tData[-1],
+    # and interpolate linearly between the nearest reported points otherwise
+    RunStats.counters['curveInterpolations'] += 1
+    result = np.zeros(len(temps))
+    for i in reversed(range(len(tData)-1)):
+        # reversed so that the first matching interval wins, as in the scalar methods
+        seg = (temps > tData[i+1]) & (temps <= tData[i])
+        frac = (temps[seg]-tData[i])/float(tData[i+1] - tData[i])
+        result[seg] = values[i] + frac * (values[i+1] - values[i])
+    result[temps <= tData[-1]] = values[-1]
+    result[temps > tData[0]] = values[0]
+    return result
+
+def textColumn(name):
+    # attribute reading a text column of the unit's row in the catalog
+    return property(lambda self: self.catalog.text(name, self.index))
+
+def ratingColumn(name):
+    # attribute reading the rating points of the unit's row in the catalog (a view, not a copy)
+    return property(lambda self: self.catalog.ratings(name, self.index))
+
 class HeatPump :
-    """Data and methods for calculation of heat pump parameters"""
-    def __init__(self, Manufacturer, Brand, ModelName, AHRICertNumber, OutdoorUnit,IndoorUnits,AHRIType,HSPFregIV,SEER,EER_95,CoolingCapacity, EnergyStar, DuctedDuctless,Zones,DuctlessIndoorType) :
-
-        self.Manufacturer=Manufacturer
-        self.Brand=Brand
-        self.ModelName=ModelName
-        self.AHRICertNumber=AHRICertNumber
-        self.OutdoorUnit=OutdoorUnit
-        self.IndoorUnits=IndoorUnits
-        self.AHRIType=AHRIType
-        self.HSPFregIV=HSPFregIV
-        self.SEER=SEER
-        self.EER_95=EER_95
-        self.CoolingCapacity = CoolingCapacity
-        self.EnergyStar=EnergyStar
-        self.DuctedDuctless=DuctedDuctless
-        self.Zones=Zones
-        self.DuctlessIndoorType = DuctlessIndoorType
-        
-        self.tData = []
-        self.CAPMin = []
-        self.CAPRated = []
-        self.CAPMax = []
-        self.COPMin = []
-        self.COPRated = []
-        self.COPMax = []
+    """Data and methods for calculation of heat pump parameters, for one unit (row) of a HeatPumpCatalog"""
+    __slots__ = ('catalog', 'index', 'tableTemps', 'table')
+
+    def __init__(self, catalog, index) :
+
+        self.catalog = catalog
+        self.index = index
+
+        self.tableTemps = None      # temperatures of the last performance table built
+        self.table = None
+
+    Manufacturer = textColumn('Manufacturer')
+    Brand = textColumn('Brand')
+    ModelName = textColumn('ModelName')
+    AHRICertNumber = textColumn('AHRICertNumber')
+    OutdoorUnit = textColumn('OutdoorUnit')
+    IndoorUnits = textColumn('IndoorUnits')
+    AHRIType = textColumn('AHRIType')
+    HSPFregIV = textColumn('HSPFregIV')
+    SEER = textColumn('SEER')
+    EER_95 = textColumn('EER_95')
+    CoolingCapacity = textColumn('CoolingCapacity')
+    EnergyStar = textColumn('EnergyStar')
+    DuctedDuctless = textColumn('DuctedDuctless')
+    Zones = textColumn('Zones')
+    DuctlessIndoorType = textColumn('DuctlessIndoorType')
+
+    # rating points, warmest first: temperatures, and the capacities and COPs at them
+    tData = ratingColumn('tData')
+    CAPMin = ratingColumn('CAPMin')
+    CAPMax = ratingColumn('CAPMax')
+    COPMin = ratingColumn('COPMin')
+    COPMax = ratingColumn('COPMax')
+
+    def __eq__(self, other):
+        return isinstance(other, HeatPump) and self.catalog is other.catalog and self.index == other.index
+
+    def __hash__(self):
+        return hash((id(self.catalog), self.index))
+
+    def __reduce__(self):
+        # pickled as its row of the catalog
+        return (operator.getitem, (self.catalog, self.index))
+
+    def PerformanceTable(self,temps):
+        # performance curves at an array of distinct temperatures, as a (4, len(temps)) array with rows
+        # MaxCapacity, MinCapacity, COPatMaxCapacity, COPatMinCapacity.  The table is kept, so repeated
+        # calls for the same temperatures (e.g. the unique temperatures of the climate data) are free,
+        # and per-hour values are a single gather: table[:, index] with index from np.unique
+        temps = np.asarray(temps, dtype=float)
+        if self.table is None or not (temps is self.tableTemps or np.array_equal(temps, self.tableTemps)):
+            self.table = np.array([interpolateCurve(self.tData, self.CAPMax, temps),
+                                   interpolateCurve(self.tData, self.CAPMin, temps),
+                                   interpolateCurve(self.tData, self.COPMax, temps),
+                                   interpolateCurve(self.tData, self.COPMin, temps)])
+            self.tableTemps = temps
+        return self.table
+
+    def Performance(self,temps):
+        # MaxCapacity, MinCapacity, COPatMaxCapacity and COPatMinCapacity for an array of temperatures
+        tempValues, tempIndex = np.unique(np.asarray(temps, dtype=float), return_inverse=True)
+        return self.PerformanceTable(tempValues)[:, tempIndex]
 
     def parametrize(self):
     #  COP/Q = c*T^2 + b*T + c : The constant part of the polynomial fit of the heat pump data
@@ -140,5 +205,54 @@ class HeatPump :
         return COP_Max
 
 
-                    
-            
+class HeatPumpSystem :
+    """Combined performance of the chosen heat pumps (HPChoice), queried as if it were one unit"""
+    def __init__(self, units) :
+
+        self.units = list(units)
+        self.numUnits = len(self.units)
+
+        self.tableTemps = None
+        self.table = None
+        self.SEER = None
+
+    def PerformanceTable(self,temps):
+        # same layout as HeatPump.PerformanceTable: summed MaxCapacity and MinCapacity of the units,
+        # and their average COPatMaxCapacity and COPatMinCapacity, at an array of distinct temperatures
+        temps = np.asarray(temps, dtype=float)
+        if self.table is None or not (temps is self.tableTemps or np.array_equal(temps, self.tableTemps)):
+            self.table = np.zeros((4, len(temps)))
+            for hp in self.units:
+                unitTable = hp.PerformanceTable(temps)
+                self.table[0:2] += unitTable[0:2]
+                self.table[2:4] += unitTable[2:4]/self.numUnits
+            self.tableTemps = temps
+        return self.table
+
+    def Performance(self,temps):
+        tempValues, tempIndex = np.unique(np.asarray(temps, dtype=float), return_inverse=True)
+        return self.PerformanceTable(tempValues)[:, tempIndex]
+
+    # single temperatures from the units themselves, leaving the table of the period as it is
+    def MaxCapacity(self,temp):
+        return sum(hp.MaxCapacity(temp) for hp in self.units)
+
+    def MinCapacity(self,temp):
+        return sum(hp.MinCapacity(temp) for hp in self.units)
+
+    def COPatMaxCapacity(self,temp):
+        return sum(hp.COPatMaxCapacity(temp)/self.numUnits for hp in self.units)
+
+    def COPatMinCapacity(self,temp):
+        return sum(hp.COPatMinCapacity(temp)/self.numUnits for hp in self.units)
+
+    def WeightedSEER(self):
+        # weighted average SEER based on fraction of total capacity at 47 degrees
+        if self.SEER is None:
+            SEER = 0.
+            CAPTOTAL = 0.
+            for hp in self.units:
+                SEER += float(hp.SEER) * hp.MaxCapacity(47)
+                CAPTOTAL += hp.MaxCapacity(47)
+            self.SEER = SEER/CAPTOTAL
+        return self.SEER
@@ -58,6 +58,8 @@ from getInput import *
 
 from HeatPump import *          # new heat pump class
 from HeatPumpAnalysis import *
+from AnalysisWorker import AnalysisWorker
+from TimeSeriesPlot import DecimatedLines
 
 HUGE_FONT = ("Verdana",36)
 LARGE_FONT = ("Verdana",20)
@@ -69,6 +71,7 @@ style.use("ggplot")
 #a = f.add_subplot(111)
 f = plt.figure()
 a = plt.subplot2grid((3,3), (0,0), rowspan=3, colspan=3)
+hourlyLines = None      # the hourly results on a, drawn at screen resolution (see TimeSeriesPlot.py)
 
 #f1 = Figure(figsize=(3,2), dpi=100)
 #a1 = f1.add_subplot(111)
@@ -123,6 +126,7 @@ def popupmsg(title, msg):
     popup.mainloop()    
 
 def animate(i):
+    global hourlyLines
 
     if len(hpa.HPChoice)>0 :
         hp = hpa.HPChoice[0]
@@ -134,18 +138,17 @@ def animate(i):
 #        a = plt.subplot2grid((6,4), (0,0), rowspan = 5, colspan = 4)
 #        a2 = plt.subplot2grid((6,4), (5,0), rowspan = 1, colspan = 4, sharex = a)
 
-        a.clear()
-        a.plot_date(hpa.timeArray,hpa.Q_required, "g", label = "Total required heat")
-        a.plot_date(hpa.timeArray,hpa.supplemental_Heat, "r", label = "Supplemental needed")
-        a.plot_date(hpa.timeArray,hpa.capacity_Max, "b", label = "Maximum Capacity")
-        a.plot_date(hpa.timeArray,hpa.QC_required, "y", label = "Cooling required")
-    
-        a.legend(bbox_to_anchor=(0,0.92,1,.102),loc=3, ncol=4, borderaxespad=0)
+        # the lines are made once, and given the new results with set_data
+        if hourlyLines is None:
+            hourlyLines = DecimatedLines(a, (("g", "Total required heat"), ("r", "Supplemental needed"),
+                                             ("b", "Maximum Capacity"), ("y", "Cooling required")))
+            a.legend(bbox_to_anchor=(0,0.92,1,.102),loc=3, ncol=4, borderaxespad=0)
+        hourlyLines.setData(hpa.timeArray, (hpa.Q_required, hpa.supplemental_Heat, hpa.capacity_Max, hpa.QC_required))
         
 #        title = "Heat Pump Performance for "+hp.Manufacturer + " Model " + hp.OutdoorUnit
         title = "Heat Pump Performance for "+hp.Brand + " Model " + hp.OutdoorUnit
         a.set_title(title)
-        f.canvas.draw()
+        f.canvas.draw_idle()
         
         hpa.updateGraph = False
         
@@ -360,8 +363,40 @@ class HomePage(tk.Frame) :
                     command = lambda: self.controller.show_frame(SupplementalHeatPage))
         button3s.pack(pady=ys)
 
+        # the analysis runs in a worker thread (see AnalysisWorker.py), its progress read here every 100 ms
+        worker = [None]
+
         def doAnalysis():
-            msg = hpa.doHeatPumpAnalysis(statusBar)
+            if worker[0] is not None and worker[0].running():
+                return
+            worker[0] = AnalysisWorker(hpa)
+            buttonA.config(text="Cancel Analysis",command = lambda: cancelAnalysis())
+            worker[0].start()
+            self.after(100, checkAnalysis)
+
+        def cancelAnalysis():
+            if worker[0] is not None:
+                worker[0].cancel()
+                statusBar.config(text="Status: cancelling")
+
+        def checkAnalysis():
+            for kind, value in worker[0].poll():
+                if kind == 'progress':
+                    statusBar.config(text="Status: %s (%.0f%%, %d hours)" % (value['text'],value['percent'],value['hours']))
+                else:
+                    buttonA.config(text="Do Analysis",command = lambda: doAnalysis())
+                    if kind == 'done':
+                        statusBar.config(text="Status: idle")
+                        analysisDone(value)
+                    elif kind == 'cancelled':
+                        statusBar.config(text="Status: analysis cancelled")
+                    else:
+                        statusBar.config(text="Status: analysis failed")
+                        popupmsg("Heat Pump Analysis Tool", "Analysis failed: %s" % value)
+                    return
+            self.after(100, checkAnalysis)
+
+        def analysisDone(msg):
             if len(msg) <100:
                 popupmsg("Heat Pump Analysis Tool", msg)
                 
@@ -372,8 +407,8 @@ class HomePage(tk.Frame) :
         button4 = ttk.Button(self,width=26,text="Fuel Options",command = lambda:self.controller.show_frame(FuelOptionsPage) )
         button4.pack(pady=ys)
 
-        button4 = ttk.Button(self,width=26,text="Do Analysis",command = lambda: doAnalysis() )
-        button4.pack(pady=ys)
+        buttonA = ttk.Button(self,width=26,text="Do Analysis",command = lambda: doAnalysis() )
+        buttonA.pack(pady=ys)
 
         button5 = ttk.Button(self,width=26,text="Show Graph",
                     command = lambda: self.controller.show_frame(GraphPage))
@@ -919,6 +954,83 @@ def updateHeatPumpInfo(info):
     info.config(text=infoText)
     info.update()
         
+class VirtualListView(tk.Frame):
+    """A list box for many rows, which draws only the rows in view"""
+    # rows: a sequence (e.g. the catalog rows of query), and rowText(row) the text shown for a row, called
+    # only for the rows in view.  Scrolling (scroll bar, mouse wheel, arrow keys, Page Up/Down) redraws the
+    # rows in view, so filling or changing the list takes the same time whatever the number of rows.
+    def __init__(self,parent,rowText,height=15,width=50):
+        tk.Frame.__init__(self,parent)
+        self.rowText = rowText
+        self.height = height
+        self.rows = []
+        self.top = 0            # position of the first row in view
+        self.selected = None    # position of the selected row
+
+        self.listbox = tk.Listbox(self,selectmode=tk.SINGLE,height=height,width=width,exportselection=False)
+        self.scrollbar = ttk.Scrollbar(self,orient=VERTICAL,command=self.scroll)
+        self.listbox.pack(side=LEFT,fill=BOTH,expand=True)
+        self.scrollbar.pack(side=LEFT,fill=Y)
+
+        self.listbox.bind('<<ListboxSelect>>', self.select)
+        self.listbox.bind('<MouseWheel>', lambda e: self.scroll('scroll', -1 if e.delta>0 else 1, 'units'))
+        self.listbox.bind('<Button-4>', lambda e: self.scroll('scroll', -1, 'units'))
+        self.listbox.bind('<Button-5>', lambda e: self.scroll('scroll', 1, 'units'))
+        self.listbox.bind('<Prior>', lambda e: self.moveSelection(-self.height))
+        self.listbox.bind('<Next>', lambda e: self.moveSelection(self.height))
+        self.listbox.bind('<Up>', lambda e: self.moveSelection(-1))
+        self.listbox.bind('<Down>', lambda e: self.moveSelection(1))
+
+    def setRows(self,rows):
+        self.rows = rows
+        self.top = 0
+        self.selected = None
+        self.draw()
+
+    def selectedRow(self):
+        if self.selected is None:
+            return None
+        return self.rows[self.selected]
+
+    def draw(self):
+        self.listbox.delete(0,END)
+        shown = [self.rowText(row) for row in self.rows[self.top:self.top+self.height]]
+        if len(shown)>0:
+            self.listbox.insert(END,*shown)
+        if self.selected is not None and self.top <= self.selected < self.top+self.height:
+            self.listbox.selection_set(self.selected-self.top)
+            self.listbox.activate(self.selected-self.top)
+        numRows = max(len(self.rows),1)
+        self.scrollbar.set(self.top/numRows, min(1.,(self.top+self.height)/numRows))
+
+    def scroll(self,action,amount,unit='units'):
+        # the scroll bar command: ('moveto', fraction) or ('scroll', number, 'units' or 'pages')
+        if action == 'moveto':
+            top = int(float(amount)*len(self.rows))
+        else:
+            top = self.top + int(amount)*(self.height if unit=='pages' else 1)
+        self.top = max(0, min(top, len(self.rows)-self.height))
+        self.draw()
+        return 'break'
+
+    def select(self,event):
+        selection = self.listbox.curselection()
+        if len(selection)>0:
+            self.selected = self.top + selection[0]
+
+    def moveSelection(self,step):
+        # move the selection (from the first row in view, if none), scrolling to keep it in view
+        if len(self.rows)==0:
+            return 'break'
+        position = self.top if self.selected is None else self.selected+step
+        self.selected = max(0, min(position, len(self.rows)-1))
+        if self.selected < self.top:
+            self.top = self.selected
+        elif self.selected >= self.top+self.height:
+            self.top = self.selected-self.height+1
+        self.draw()
+        return 'break'
+
 class SelectHeatPumpPage(tk.Frame):
     def __init__(self,parent,controller):
         tk.Frame.__init__(self,parent)
@@ -934,36 +1046,42 @@ class SelectHeatPumpPage(tk.Frame):
     def LayoutFrame(self):
         HPFilter = ['Ductless','Ducted','All']
 
-        HPListIndex2ID = []
-        
         label=ttk.Label(self,text="\tHeat Pump Selection Page: View parameters for NEEP recommended cold climate heat pumps\n",font=LARGE_FONT)
         label.grid(row=0,column=0,columnspan=5, sticky=(W,E))
 
 #        Would like to have a manufacturers list box, and filter the heatpump models offered by that manufacturer
 #        lbM = tk.Listbox(self,selectmode=tk.SINGLE,height=15,width=15)        
 
-        lb = tk.Listbox(self,selectmode=tk.SINGLE,height=15,width=50)
+        # the heat pump list, below a search box which filters it as you type (brand, model or AHRI number)
+        listFrame = tk.Frame(self)
+        searchFrame = tk.Frame(listFrame)
+        searchFrame.pack(side=TOP, fill=X)
+        ttk.Label(searchFrame,text="Search",font=NORM_FONT).pack(side=LEFT)
+        searchVar = StringVar()
+        searchEntry = ttk.Entry(searchFrame,textvariable=searchVar)
+        searchEntry.pack(side=LEFT, fill=X, expand=True)
+
+        def HPListText(h):
+            hp = hpa.HPList[h]
+            insertText = hp.Brand + " Model " + hp.OutdoorUnit + " " + hp.DuctedDuctless
+#            insertText = hp.Manufacturer + " Model " + hp.OutdoorUnit + " " + hp.DuctedDuctless
+            if hp.DuctedDuctless == 'Ductless': insertText+='-' + hp.Zones
+            return insertText
+
+        lb = VirtualListView(listFrame,HPListText,height=15,width=50)
+        lb.pack(side=TOP)
 
         HPType = IntVar()
         HPType.set(0)
                     
         def FillHPListBox(lb, filterVar):
-            HPListIndex2ID.clear()
-            lb.delete(0,lb.size())
             filter = filterVar    # the string variable
             filter = HPFilter[filter]
-            h = 0
-            for hp in hpa.HPList:
-                ductless = (hp.DuctedDuctless == 'Ductless')
-                if ( (ductless and (filter=='Ductless' or filter=='All')) or ((not ductless) and (filter != 'Ductless'))) :
-                    insertText = hp.Brand + " Model " + hp.OutdoorUnit + " " + hp.DuctedDuctless
-#                    insertText = hp.Manufacturer + " Model " + hp.OutdoorUnit + " " + hp.DuctedDuctless
-                    if hp.DuctedDuctless == 'Ductless': insertText+='-' + hp.Zones
-                        
-                    lb.insert(h,insertText)
-                    HPListIndex2ID.append(h)
-                h += 1
-            print("Heat pump list filled")
+            # the matching units, from the catalog indexes; only those in view are drawn
+            ductless = None if filter=='All' else (filter=='Ductless')
+            lb.setRows(hpa.catalog.query(ductless=ductless, text=searchVar.get().strip().lower()))
+
+        searchVar.trace_add('write', lambda *args: FillHPListBox(lb,HPType.get()))
 
         rb1 = tk.Radiobutton(self, text="Ductless", variable=HPType, value=0, command=lambda: FillHPListBox(lb,0))
         rb2 = tk.Radiobutton(self, text="Ducted",   variable=HPType, value=1, command=lambda: FillHPListBox(lb,1))
@@ -974,8 +1092,7 @@ class SelectHeatPumpPage(tk.Frame):
         rb3.grid(row=1,column=2)
         rb1.invoke()
 
-        lb.grid(row=2,column=0, rowspan=1,columnspan=3,sticky=(N))
-        lb.activate(0)
+        listFrame.grid(row=2,column=0, rowspan=1,columnspan=3,sticky=(N))
         
         canvas = FigureCanvasTkAgg(f1,self)
         canvas.draw()
@@ -987,12 +1104,18 @@ class SelectHeatPumpPage(tk.Frame):
         text2 = ttk.Label(self,text='',font=NORM_FONT)
         text2.grid(row=4,column=0,columnspan=3,sticky=(N,E,W))
 
+        def selectedHeatPump(command):
+            # run command (selHeatPump or addHeatPump) for the heat pump selected in the list, if any
+            h = lb.selectedRow()
+            if h is not None:
+                command(h,text2)
+
         button1 = ttk.Button(self,text="Select Heat Pump",
-                    command = lambda: selHeatPump(HPListIndex2ID[lb.curselection()[0]],text2))
+                    command = lambda: selectedHeatPump(selHeatPump))
         button1.grid(row=5, column=0)
   
         button2 = ttk.Button(self,text="Add Heat Pump",
-                    command = lambda: addHeatPump(HPListIndex2ID[lb.curselection()[0]],text2))
+                    command = lambda: selectedHeatPump(addHeatPump))
         button2.grid(row=5, column=1)
        
         button3 = ttk.Button(self,text="Clear Heat Pump selection",
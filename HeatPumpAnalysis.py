@@ -39,9 +39,15 @@
 import os
 
 from HeatPump import *          # new heat pump class
+import ClimateData
+import HeatPumpCatalog
+import RunStats
+from ResultCache import ResultCache, resultKey
+from ResultsWriter import ResultsWriter
 
 from datetime import datetime, date, time
 from pylab import *
+import numpy as np
 
 #HEAT_PUMP_FILE_NAME = 'Cold Climate Air-Source Heat Pump Listing.txt'
 HEAT_PUMP_FILE_NAME = 'ColdClimateAir-SourceHeatPumpSpecificationListing-Updated 7.14.17_1.txt'
@@ -75,13 +81,61 @@ EFFICIENCY_HVAC_OTHER = 1.0
 ENERGY_CONTENT_OTHER = 1
 KGCO2_PER_UNIT_OTHER = 0
 
+# settings the analysis results depend on, besides the deliveries, heat pumps and climate data (see analysisKey)
+ANALYSIS_INPUTS = ('BaseHeatType', 'BaseHvacEfficiency', 'BaseEnergyContent', 'BaseEnergyUnits', 'BaseKgCO2PerUnit', 'BaseCostPerUnit',
+                   'SuppHeatType', 'SuppHvacEfficiency', 'SuppEnergyContent', 'SuppEnergyUnits', 'SuppKgCO2PerUnit', 'SuppCostPerUnit',
+                   'SuppOutdoorTempNABL', 'WaterHeatType', 'WaterEnergyContent', 'WaterKgCO2PerUnit', 'WaterCostPerUnit',
+                   'WaterHeatMonthlyUsage', 'WaterHeatCombinedBill', 'HPWaterHeaterCOP', 'ElecKgCO2PerUnit',
+                   'STANDARD_PRICE_OIL', 'STANDARD_PRICE_GAS', 'STANDARD_PRICE_ELEC', 'STANDARD_PRICE_LPG',
+                   'WinterHPSetPoint', 'SummerHPSetPoint', 'SummerBLSetPoint', 'BaselineAC', 'BaselineSEER',
+                   'turn_ON_Date', 'turn_OFF_Date', 'climateFill')
+
+# what doHeatPumpAnalysis leaves for the user interface, stored with the results text
+ANALYSIS_RESULTS = ('BaseUnitsByYear', 'BaseCostByYear', 'KWhByYear', 'SuppUnitsByYear', 'SuppUsesByYear', 'BLAC_KWhByYear',
+                    'HPAC_KWhByYear', 'HeatPumpAverageUnits', 'BaseAverageUnits', 'BLACAverageUnits', 'SuppAverageUnits',
+                    'BaseCostPerUnit', 'SuppCostPerUnit', 'WaterCostPerUnit', 'average_Resistance', 'approx_Resistance',
+                    'totalRequiredHeating', 'totalRequiredCooling', 'timeArray', 'Q_required', 'QC_required',
+                    'electric_Required', 'capacity_Max', 'capacity_Min', 'supplemental_Heat', 'COP_Ave',
+                    'analysisSummary', 'yearlyResults', 'referenceYearResults')
+
+# settings read by the yearly rollup of the analysis (see stageInputs)
+ROLLUP_INPUTS = ('STANDARD_PRICE_ELEC', 'BaseCostPerUnit', 'SuppCostPerUnit', 'WaterCostPerUnit', 'BaseKgCO2PerUnit',
+                 'SuppKgCO2PerUnit', 'WaterKgCO2PerUnit', 'ElecKgCO2PerUnit', 'BaseHeatType', 'SuppHeatType', 'WaterHeatType',
+                 'BaseHvacEfficiency', 'BaseEnergyContent', 'WaterEnergyContent', 'WaterHeatMonthlyUsage',
+                 'WaterHeatCombinedBill', 'HPWaterHeaterCOP', 'BaselineAC', 'SummerBLSetPoint', 'SummerHPSetPoint')
+
+# share of the progress of doHeatPumpAnalysis (percent) for the stages of the analysis period, the rest being
+# for the reference years
+STAGES_PERCENT = 80
+
+# temperature data and results of the analysis period, which the reference year analysis replaces for a while
+PERIOD_STATE = ('t_Data', 'T_Outdoor', 't_Array', 'T_Array', 't_Start', 't_End', 'heatingMask', 'coolingMask', 'maskData',
+                'maskKey', 'BaseUnitsByYear', 'BaseCostByYear', 'KWhByYear', 'SuppUnitsByYear', 'SuppUsesByYear',
+                'BLAC_KWhByYear', 'HPAC_KWhByYear', 'totalRequiredHeating', 'totalRequiredCooling')
+
+def yearTotals(values, years, startYear, numYears, initial=None):
+    # per-year running sums of an hourly array, accumulated in time order like the hourly loop
+    # (cumsum is sequential, so the totals match the loop's += exactly)
+    totals = []
+    for Y in range(numYears):
+        lo = np.searchsorted(years, startYear+Y, side='left')
+        hi = np.searchsorted(years, startYear+Y, side='right')
+        start = 0.0 if initial is None else initial[Y]
+        if hi>lo:
+            totals.append(float(np.cumsum(np.concatenate(([start],values[lo:hi])))[-1]))
+        else:
+            totals.append(start)
+    return totals
+
 class HeatPumpAnalysis :    
     """Data and methods for calculation of heat pump parameters"""
     def __init__(self) :
         # Heat pump parameters
 
-        self.HPList = []         # list of all defined heat pumps
+        self.catalog = None      # the heat pump listing, see loadHeatPumps()
+        self.HPList = []         # list of all defined heat pumps (views of the catalog rows)
         self.HPChoice = []       # new: list of chosen heat pumps (objects from HPList, can be repeated)
+        self.HPSystem = None     # combined performance of HPChoice, see heatPumpSystem()
 
         self.HEAT_NAME_OIL = "Fuel Oil"
         self.HEAT_NAME_GAS = "Natural Gas"
@@ -154,6 +208,8 @@ class HeatPumpAnalysis :
 
         # times at which the temperature data was taken, this includes date and time
         self.t_Data = []    # (1 To SITE_DATA_MAX) As Date 
+        self.t_Array = np.zeros(0, dtype='datetime64[s]')     # array copies of t_Data and T_Outdoor
+        self.T_Array = np.zeros(0)
         self.t_Start = 0
         self.t_End = 0
 
@@ -169,6 +225,12 @@ class HeatPumpAnalysis :
         self.turn_ON_Date  = datetime.date(2015,9,15)   # As Date # winter time on which the customer is likely to turn the HVAC
         self.turn_OFF_Date  = datetime.date(2015,6,1)  # As Date # turn off HVAC heating
 
+        # heating and cooling masks over t_Data (see seasonMasks)
+        self.heatingMask = None
+        self.coolingMask = None
+        self.maskData = None
+        self.maskKey = None
+
         # average resistance is calculated per purchase period
         self.approx_Resistance = [] # (1 To PURCHASES_MAX, 1 To 2) As Double 
         self.average_Resistance = -1.0
@@ -193,10 +255,30 @@ class HeatPumpAnalysis :
         self.BaseCostByYear = []
         self.BLAC_KWhByYear = []
         self.HPAC_KWhByYear = []
+        self.totalRequiredHeating = 0.
+        self.totalRequiredCooling = 0.
   
+        self.arrayEngine = True     # use heatPumpPerformanceArray (whole-array NumPy version of the hourly loop)
+        self.climateFill = 'hold'   # how gaps in the temperature readings are filled, 'hold' or 'linear' (see ClimateData.py);
+                                    # not 'flag', as the hourly analysis has no use for hours without a temperature
+
+        # results of the last analysis as numbers, for programs other than the UI (see HeatPumpBatch.py)
+        self.analysisSummary = {}
+        self.yearlyResults = []         # one entry per year of the analysis period, as in the results table
+        self.referenceYearResults = []  # average and coldest heating years
+        self.writeResultsFile = True    # append the results table to Output Data/Heat Pump Analysis-<date>.txt
+        self.resultsWriter = ResultsWriter('./Output Data')     # and the results to the CSV and JSON Lines dataset there
+        self.resultCache = ResultCache()    # results of recent analyses by their inputs (None: always recalculate)
+
         self.updateGraph = False
-        self.updateTemp = True
-        self.updateResistance = True
+
+        # settings each stage of the analysis last ran with, so only stages with changed settings run again (see runStages)
+        self.stageKeys = {}
+        self.stageRuns = []     # stages run by the last analysis
+        # price-independent totals of each reference year, with the settings they were calculated with (see referenceYear)
+        self.referenceTotals = {}
+        self.runStats = RunStats.RunStats()     # timing and counters of the analysis running (see RunStats.py)
+        self.runSummary = {}                    # and the summary of the last analysis
 
         def find(name,path):
             for root,dirs,files in os.walk(path):
@@ -271,8 +353,6 @@ class HeatPumpAnalysis :
         self.SuppEnergyUnits = self.BaseEnergyUnits
         self.SuppKgCO2PerUnit = self.BaseKgCO2PerUnit
         self.SuppCostPerUnit = self.BaseCostPerUnit
-    
-        self.updateResistance = True
 
     def SetSuppHeat(self,BLT) :
         if BLT == HEAT_TYPE_OIL :    # oil
@@ -312,8 +392,6 @@ class HeatPumpAnalysis :
             self.SuppCostPerUnit = 0
         print("Supplemental system chosen: "+self.SuppHeatType)
 
-        self.updateResistance = True
-
   
     def SetBLWScenario(self,BLT) :
         if BLT == HEAT_TYPE_OIL :    # oil
@@ -348,8 +426,6 @@ class HeatPumpAnalysis :
         print("Water scenario chosen: "+self.WaterHeatType)
         self.WaterHeatMonthlyUsage = self.WaterHeatMonthlyBTU/self.WaterEnergyContent      
 
-        self.UpdateResistance = True
-
     def SetBLAScenario(self,BLA) :
         if BLA == 0 :    # none
             self.BaselineAC = 0
@@ -511,9 +587,6 @@ class HeatPumpAnalysis :
 
             self.numDeliveries += 1
 
-        self.UpdateTemp = True
-        self.UpdateResistance = True
-    
         return self.numDeliveries
     def saveFuelDeliveries(self,purchasesFile):
         # open the purchases file
@@ -575,112 +648,39 @@ class HeatPumpAnalysis :
         self.purchase_Cost.insert(id,cost)
         self.purchase_Quantity.insert(id,amount)
 
+    def findHeatPump(self,AHRICertNumber):
+        # the heat pump in HPList with this AHRI certificate number, None if it is not listed
+        for heatPump in self.HPList:
+            if heatPump.AHRICertNumber.strip() == str(AHRICertNumber).strip():
+                return heatPump
+        return None
+
     def loadHeatPumps(self):
 
-        def tF(stringvar):
-            if len(stringvar)==0:
-                return -1.0
-            if stringvar=="#DIV/0!":
-                return -99.0
-            return float((stringvar.replace(',','')).replace('"',''))
-            
-        # read the heat pump data file
+        # read the heat pump data file (parsed into arrays by HeatPumpCatalog, from its cache when current)
         filename = HEAT_PUMP_FILE_NAME
         HeatPumpDataFile = self.workingDirectory + filename
-        
-        input = open(HeatPumpDataFile,'r', encoding='latin-1')
-        test = input.read()
-        lines = test.split('\n')
-
-        # Skip ahead to the line which starts "Manufacturer"
-        LN = 0      # step through data starting at first line
-        while True:
-            tokens = lines[LN].split('\t')
-            LN +=1
-            if (tokens[0]=='Manufacturer'):
-                break;
-
-        # ' Load Heat Pump Data
-        while True:
-            
-            if (LN==len(lines)):
-                break
-                
-            tokens = lines[LN].split('\t') 
-            LN += 1
-                
-            if tokens[0]=='': 
-                break               
-            if len(tokens)<50 : 
-                continue
-    
-#           7/19/17 BHN:  Updated to ColdClimateAir=SourceHeatPumpSpecificationListing 7.14.17
-            heatPump = HeatPump(Manufacturer=tokens[0], Brand=tokens[1], ModelName=tokens[2],AHRICertNumber=tokens[3], OutdoorUnit=tokens[4],                
-                IndoorUnits=tokens[5],AHRIType=tokens[6],HSPFregIV=tokens[7],SEER=tokens[8],EER_95=tokens[9],CoolingCapacity=tokens[10],
-                EnergyStar=tokens[11],DuctedDuctless=tokens[12],Zones=tokens[13],DuctlessIndoorType=tokens[14])
-    
-    
-            C1 = 16 # first column with data values, in the file from 7.14.17
-            C2 = 53 # the column with a third optional temperature value
-            try:
-                # calculate linear parameters a and b from the NEEP data
-                tData = [47,17,5]
-                CAPMin = []
-                CAPRated = []
-                CAPMax = []
-                COPMin = []
-                COPRated = []
-                COPMax = []
-                CAPMin.append(tF(tokens[C1+ 0]))
-                CAPMin.append(tF(tokens[C1+10]))
-                CAPMin.append(tF(tokens[C1+20]))
-
-                CAPMax.append(tF(tokens[C1+ 2]))
-                CAPMax.append(tF(tokens[C1+12]))
-                CAPMax.append(tF(tokens[C1+22]))
-            
-                COPMin.append(tF(tokens[C1+ 6]))
-                COPMin.append(tF(tokens[C1+16]))
-                COPMin.append(tF(tokens[C1+26]))
+        self.useCatalog(HeatPumpCatalog.HeatPumpCatalog.load(HeatPumpDataFile))
+
+    def useCatalog(self,catalog):
+        # the heat pumps of a catalog already loaded (by another HeatPumpAnalysis, as HeatPumpBatch shares one)
+        self.catalog = catalog
+        self.HPList = catalog.units
+
+    def showStatus(self,status,text,stage=None,percent=None,hours=None):
+        # pass info back to the UI, when there is one (none when run from HeatPumpBatch.py): a status bar label,
+        # or an AnalysisWorker.AnalysisProgress, which also takes the stage, the percent done and the hours of
+        # climate data processed, and stops a cancelled analysis here
+        if status is None:
+            return
+        if hasattr(status,'report'):
+            status.report(text,stage,percent,hours)
+        else:
+            status.config(text=text)
+            status.update()
 
-                COPMax.append(tF(tokens[C1+ 8]))
-                COPMax.append(tF(tokens[C1+18]))
-                COPMax.append(tF(tokens[C1+28]))
-                
-                if (len(tokens[C2])>0) & (tokens[C2] != 'N/A'):
-                    tMin = tF(tokens[C2])
-                    tData.append(tMin)
-                    capMin = tF(tokens[C2+1])
-                    capMax = tF(tokens[C2+3])
-                    copMin = tF(tokens[C2+7])
-                    copMax = tF(tokens[C2+9])
-                    if capMin<0. :
-                        capMin = capMax
-                        copMin = copMax
-                        
-                    CAPMin.append(capMin)
-                    CAPMax.append(capMax)
-                    COPMin.append(copMin)
-                    COPMax.append(copMax)
-            
-                heatPump.tData = tData
-                heatPump.CAPMin = CAPMin
-                heatPump.CAPMax = CAPMax 
-                heatPump.COPMin = COPMin
-                heatPump.COPMax = COPMax
-                   
-#               heatPump.parametrize()
-
-                self.HPList.append(heatPump)
-            
-            except Exception as e:
-                print(e)
-                
-    def LoadTempDataRaw(self,status, year=0):
+    def LoadTempDataRaw(self,status=None, year=0):
     
-        self.T_Outdoor.clear()
-        self.t_Data.clear()
-
         if year==0:
             yearStart = self.purchase_Date[0].year
             if yearStart<2002 :
@@ -689,11 +689,10 @@ class HeatPumpAnalysis :
         else:
             yearStart = yearEnd = year
         
-        prevTemp = -999
-        oneHour = datetime.timedelta(0,0,0,0,0,1,0)
-    
         # loop over files from these years
         ClimaticDataPath = self.workingDirectory + 'Climate Data/KBED'
+        tYears = []
+        TYears = []
         for year in range(yearStart,yearEnd+1):
             # Switch to .csv files downloaded directly from Mesowest site
             #filename = "%s-%i.txt" % (ClimaticDataPath, year) 
@@ -701,35 +700,24 @@ class HeatPumpAnalysis :
             print("Reading "+filename)
         
             # can one get this information to the UI?  (updating a text widget)
-            status.config(text="Loading temperature data from: "+filename)
-            status.update()
+            self.showStatus(status,"Loading temperature data from: "+filename)
+
+            # parsed once, then read from the binary cache, and kept in memory for the session (see ClimateData.py)
+            t, T = ClimateData.stationYear(filename, year, self.climateFill)
+            tYears.append(t)
+            TYears.append(T)
+
+        # array copies of the hourly data for the whole-array calculations (a single year, such as a reference
+        # year, is used as stored)
+        if len(tYears)==1:
+            self.t_Array = tYears[0]
+            self.T_Array = TYears[0]
+        else:
+            self.t_Array = np.concatenate(tYears)
+            self.T_Array = np.concatenate(TYears)
 
-            LN = -1
-            nextHour = datetime.datetime(year,1,1,0,0)
-            for line in open(filename,'r',encoding='latin-1'):
-                LN+=1
-                if LN<8: 
-                    continue
-                tokens = line.rstrip().split(',')
-                if len(tokens)<1:
-                    break
-                try:
-                    datestring = tokens[1]
-                    dateTime = datetime.datetime.strptime(datestring[0:-4], "%m/%d/%Y %H:%M")
-                except:     # hit the line past the date lines
-                    break
-
-                try:
-                    #temp = float(tokens[1])
-                    temp = float(tokens[2])
-                except:
-                    pass
-                
-                # record hourly data when the next dateTime point is past the nextHour to be recorded     
-                while nextHour<dateTime :
-                    self.t_Data.append(nextHour)
-                    self.T_Outdoor.append(temp)                
-                    nextHour = nextHour+oneHour  
+        self.t_Data = self.t_Array.tolist()
+        self.T_Outdoor = self.T_Array.tolist()
             
     def LoadTempData(self):     # OBSOLETE
         # Load climatic data
@@ -768,13 +756,21 @@ class HeatPumpAnalysis :
 
         print("Temperature data loaded")        
  
-    def doHeatPumpAnalysis(self,status): 
-        # certain years of note since 1993
-        AverageHDDYear = 2008
-        AverageCDDYear = 2003
-        HighestHDDYear = 2003
-        HighestCDDYear = 2010
+    def doHeatPumpAnalysis(self,status=None):
+        # the analysis (runAnalysis), timed and counted by a RunStats, whose summary is kept in runSummary
+        self.runStats = RunStats.RunStats()
+        self.runStats.start()
+        try:
+            return self.runAnalysis(status)
+        except BaseException as e:
+            self.runStats.outcome = type(e).__name__
+            raise
+        finally:
+            self.runSummary = self.runStats.finish()
+
+    def runAnalysis(self,status=None): 
     
+        self.runStats.info.update(heatPumps=len(self.HPChoice), arrayEngine=self.arrayEngine)
         if len(self.HPChoice)==0 and self.HPWaterHeaterCOP==0 and self.SuppHeatType==self.BaseHeatType:
             msg = "No heat pump or H.P. water heater selected"
             return msg
@@ -792,33 +788,34 @@ class HeatPumpAnalysis :
                 if n<len(self.HPChoice):
                     hpNames += "+"
 
-        if self.updateTemp :
-            # pass info back to UI status bar
-            status.config(text="Loading temperature data for period")
-            status.update()
-            self.LoadTempDataRaw(status)
-            self.updateTemp = False
+        # an analysis repeated with unchanged inputs is not recalculated
+        key = None
+        if self.resultCache is not None:
+            self.runStats.lap('resultCache')
+            key = self.analysisKey()
+            stored = self.resultCache.get(key)
+            if stored is not None:
+                RunStats.counters['resultCacheHits'] += 1
+                for name in ANALYSIS_RESULTS:
+                    setattr(self, name, stored[name])
+                # the stored results replace those of the stages run last, so only the temperature data
+                # (which is left as it was) is still current for the next analysis
+                self.stageKeys = {stage: self.stageKeys[stage] for stage in ('climate', 'masks') if stage in self.stageKeys}
+                self.stageRuns = []
+                results = stored['results']
+                if self.writeResultsFile:
+                    self.runStats.lap('save')
+                    self.showStatus(status,"Saving results")
+                    self.outputData(results)
+                if len(self.HPChoice)>0:
+                    self.updateGraph = True
+                return results
 
-        self.updateResistance = True
-        if self.updateResistance :
-            status.config(text="Calculating home thermal resistance")
-            status.update()
-            self.approxResistance()
-            self.updateResistance = False
+        self.referenceYearResults = []
 
-        if len(self.HPChoice)>0:
-            status.config(text="Analyzing heat pump performance")
-            status.update()
-            p = self.heatPumpPerformance(0)
-        elif self.SuppHeatType != self.BaseHeatType:
-            status.config(text="Analyzing supplemental system performance")  
-            status.update()
-            p = self.heatPumpPerformance(0)
-        
-        totSavings = totBaseEmissions = totHPEmissions = totSuppEmissions = 0.
-        totHPACEmissions = totBLACEmissions = 0.0
-        totHPHWEmissions = totBLHWEmissions = 0.0
-    
+        self.runStages(status)
+
+        self.runStats.lap('report')
         BLAC = self.BaselineAC != 0 and self.SummerBLSetPoint> 0
         HPAC = self.SummerHPSetPoint>0
 
@@ -827,8 +824,10 @@ class HeatPumpAnalysis :
             results = "\nAnalysis of heat pump performance for " + hpNames +"\n\n"
         elif self.HPWaterHeaterCOP>0:
             results = "\nAnalysis of heat pump water heater, COP = %.1f\n\n" % (self.HPWaterHeaterCOP)
-        elif SuppHeatType != BaseHeatType:
+        elif self.SuppHeatType != self.BaseHeatType:
             results = "\nAnalysis of supplemental heat system change to %s\n\n" % (self.SuppHeatType)
+        else:
+            results = "\nAnalysis of baseline %s heating\n\n" % (self.BaseHeatType)
         
         # First line of table
         results += "\tBaseline ("+self.BaseHeatType+")\t\t"
@@ -884,12 +883,274 @@ class HeatPumpAnalysis :
 
         results += "\n"
 
+        for yearResult in self.yearlyResults:     # first and last years tend to be truncated, with potentially misleading results
+            resultline = "%d\t%.0f\t$%.0f\t" % (yearResult['year'],yearResult['baseUnits'],yearResult['baseCost'])
+            if yearResult['waterUnits'] is not None:
+                resultline += "%.0f\t$%.0f\t" % (yearResult['waterUnits'],yearResult['waterCost'])
+            if yearResult['baselineACKWh'] is not None:
+                resultline += "%.0f\t$%.0f\t" % (yearResult['baselineACKWh'],yearResult['baselineACCost'])
+        
+            resultline += " |  "
+
+            if yearResult['heatPumpKWh'] is not None:
+                resultline += "%.0f\t$%.0f\t%.1f\t" % (yearResult['heatPumpKWh'],yearResult['heatPumpCost'],yearResult['COP'])
+            if yearResult['hpWaterKWh'] is not None:
+                resultline += "%.0f\t$%.0f\t" % (yearResult['hpWaterKWh'],yearResult['hpWaterCost'])
+
+            resultline += " |  "
+
+            if yearResult['suppUnits'] is not None:
+                resultline += "%d\t%.0f\t$%.0f\t" % (yearResult['suppUses'],yearResult['suppUnits'],yearResult['suppCost'])
+                if yearResult['heatPumpACKWh'] is not None:
+                    resultline += "%.0f\t$%.0f" % (yearResult['heatPumpACKWh'],yearResult['heatPumpACCost'])
+            
+            resultline += "\n"
+            
+            results += resultline
+
+        summary = self.analysisSummary
+        if summary['savings']>0 :
+            savingsImpact = "saved"
+        else:
+            savingsImpact = "cost an additional"
+        if summary['CO2PercentImpact']>0 : 
+            CO2Impact = "less"
+        else:
+            CO2Impact = "more"
+        results += "\nOver the years %d-%d, the %s would have %s $%.0f, emitting %.0f%% %s CO2eq than %s\n" % (summary['firstYear'],summary['lastYear'],summary['change'],
+                                                                                                              savingsImpact, abs(summary['savings']), summary['CO2PercentImpact'], CO2Impact,self.BaseHeatType)
+
+        waterUsage = 12.*self.WaterHeatMonthlyUsage
+        HPWaterUnits = self.heatPumpWaterUnits()
+
+        analyzeExtremes = True
+        if len(self.HPChoice)>0 and analyzeExtremes:
+            # BHN 7/20/17 - update prices for baseline and supplemental heat to be the standard price set from the Fuel Options page
+            self.UpdatePrices()
+
+            # the reference years are analyzed with their own temperature data and per-year totals; those of the
+            # analysis period are put back afterwards, so the stages already run stay current for the next analysis
+            periodState = {}
+            for name in PERIOD_STATE:
+                value = getattr(self, name)
+                periodState[name] = list(value) if isinstance(value, list) else value
+
+            # years of note in the climate record, at the current set points
+            AverageHDDYear, AverageCDDYear, HighestHDDYear, HighestCDDYear = self.referenceYears()
+
+            self.runStats.lap('reference')
+            try:
+                for n, year in enumerate((AverageHDDYear, HighestHDDYear)) :
+                # average year first
+                    self.showStatus(status,"Analyzing reference year %d" % year,stage='reference',percent=STAGES_PERCENT+n*(100-STAGES_PERCENT)/2)
+                    totals = self.referenceYear(year,status)
+                    baseUnits = totals['baseUnits']
+                    KWh = totals['heatPumpKWh']
+                    suppUnits = totals['suppUnits']
+                    BLAC_KWh = totals['baselineACKWh']
+                    HPAC_KWh = totals['heatPumpACKWh']
+                    totalRequiredHeating = totals['totalRequiredHeating']
+                    # the baseline cost at the current price, summed over the hours as the hourly analysis does
+                    baseCost = yearTotals(self.BaseCostPerUnit*totals['heat']/self.BaseHvacEfficiency/self.BaseEnergyContent,
+                                          np.full(len(totals['heat']), year), year, 1)[0]
+
+                    totBaseEmissions = self.BaseKgCO2PerUnit*baseUnits
+                    totBLHWEmissions = self.WaterKgCO2PerUnit*waterUsage
+                    totBLACEmissions = BLAC_KWh*self.ElecKgCO2PerUnit
+                    totHPEmissions   = self.ElecKgCO2PerUnit*KWh
+                    totHPACEmissions = HPAC_KWh*self.ElecKgCO2PerUnit
+                    totHPHWEmissions = HPWaterUnits*self.ElecKgCO2PerUnit
+                    totSuppEmissions = self.SuppKgCO2PerUnit*suppUnits
+
+                    totSavings = baseCost - (KWh*self.STANDARD_PRICE_ELEC + suppUnits*self.SuppCostPerUnit) 
+                    if BLAC or HPAC :
+                        totSavings += (BLAC_KWh-HPAC_KWh) * self.STANDARD_PRICE_ELEC
+                    # Bug fix: add hot water heater savings for average and coldest years
+                    if self.HPWaterHeaterCOP>0:
+                        totSavings += 12.*self.WaterHeatMonthlyUsage * self.WaterCostPerUnit - HPWaterUnits*self.STANDARD_PRICE_ELEC
+                    if totSavings>0 :
+                        savingsImpact = "saved"
+                    else:
+                        savingsImpact = "cost an additional"
+    
+                    CO2_percent_impact = (100.*(totBaseEmissions + totBLACEmissions - totHPEmissions - totSuppEmissions- totHPACEmissions))
+                    if totHPHWEmissions > 0:
+                        CO2_percent_impact += 100.*(totBLHWEmissions - totHPHWEmissions)
+                    CO2_percent_impact /= (totBaseEmissions+totBLACEmissions+totBLHWEmissions)
+            
+                    if CO2_percent_impact>0 : 
+                        CO2Impact = "less"
+                    else:
+                        CO2Impact = "more"
+    
+                    percentOfLoad = 100.* (totalRequiredHeating  - suppUnits*self.SuppEnergyContent)/totalRequiredHeating
+            
+                    if year == AverageHDDYear:
+                        self.HeatPumpAverageUnits = KWh + HPAC_KWh
+                        self.BaseAverageUnits = baseUnits
+                        if self.HPWaterHeaterCOP>0 :
+                            self.HeatPumpAverageUnits += HPWaterUnits
+                            self.BaseAverageUnits += waterUsage
+                        if BLAC:
+                            self.BLACAverageUnits = BLAC_KWh
+                        else:
+                            self.BLACAverageUnits = 0.
+                    
+                        self.SuppAverageUnits = suppUnits
+                        adj = "Average"
+                    else:
+                        adj = "Coldest"
+                    results += "%s heating year (%d), heat pump covers " % (adj,year)
+                    results += "%.1f%% of heating load, %s $%.0f, " % (percentOfLoad,savingsImpact,abs(totSavings))
+                    results += "emits %.0f%% %s CO2 than %s\n" % (CO2_percent_impact,CO2Impact,self.BaseHeatType)
+                    self.referenceYearResults.append(dict(type=adj, year=year, percentOfLoad=percentOfLoad, savings=totSavings,
+                                                          CO2PercentImpact=CO2_percent_impact, baseUnits=baseUnits,
+                                                          heatPumpKWh=KWh, heatPumpACKWh=HPAC_KWh, suppUnits=suppUnits))
+            finally:
+                # also when the analysis is stopped (cancelled) part way
+                for name in PERIOD_STATE:
+                    setattr(self, name, periodState[name])
+
+        if self.writeResultsFile:
+            self.runStats.lap('save')
+            self.showStatus(status,"Saving results",stage='save',percent=100)
+            self.outputData(results)
+
+        if len(self.HPChoice)>0:
+            self.updateGraph = True
+
+        if key is not None:
+            self.runStats.lap('resultCache')
+            stored = {name: getattr(self, name) for name in ANALYSIS_RESULTS}
+            stored['results'] = results
+            self.resultCache.put(key, stored)
+
+        return results
+
+    def referenceYears(self):
+        # the median and highest heating degree day years, and the median and highest cooling degree day years,
+        # of the complete years of climate data (degree days at the heat pump set points, see ClimateData.py)
+        index = ClimateData.degreeDayIndex(self.workingDirectory + 'Climate Data', self.WinterHPSetPoint, self.SummerHPSetPoint,
+                                           fill=self.climateFill)
+        if len(index)==0:
+            print("No complete years of climate data, using the 1993-2015 reference years")
+            return 2008, 2003, 2003, 2010
+        byHDD = sorted(index, key=lambda year: index[year][0])
+        byCDD = sorted(index, key=lambda year: index[year][1])
+        median = (len(index)-1)//2
+        return byHDD[median], byCDD[median], byHDD[-1], byCDD[-1]
+
+    def stageInputs(self):
+        # the stages of the analysis in order, each with the settings it reads besides the results of the stages before it
+        return (('climate', (self.workingDirectory, self.purchase_Date[0].year, self.purchase_Date[-1].year, self.climateFill,
+                             ClimateData.stationFingerprint(self.workingDirectory + 'Climate Data'))),
+                ('masks', (self.turn_ON_Date, self.turn_OFF_Date, self.WinterHPSetPoint, self.SummerHPSetPoint)),
+                ('resistance', (tuple(self.purchase_Date), tuple(self.purchase_Quantity), tuple(self.purchase_Cost),
+                                self.BaseHeatType, self.BaseHvacEfficiency, self.BaseEnergyContent,
+                                self.WaterHeatType, self.WaterHeatMonthlyUsage)),
+                ('hourly', (tuple(self.HPChoice), self.arrayEngine, self.BaseHeatType, self.SuppHeatType,
+                            self.SuppOutdoorTempNABL, self.SuppHvacEfficiency, self.SuppEnergyContent,
+                            self.BaselineAC, self.BaselineSEER)),
+                ('rollup', tuple(getattr(self, name) for name in ROLLUP_INPUTS) + (len(self.HPChoice),)))
+
+    def runStages(self,status=None,through=None):
+        # Run the stages of the analysis whose settings changed since they last ran, and every stage after one that
+        # runs: climate data -> season masks -> resistance -> hourly performance -> yearly rollup.  The results
+        # table is then written from the rollup (and the reference years analyzed) by doHeatPumpAnalysis.
+        # through: the last stage to run (screenHeatPumps only needs the stages up to the resistance)
+        self.stageRuns = []
+        stages = self.stageInputs()
+        for i, (stage, inputs) in enumerate(stages):
+            if self.stageRuns or self.stageKeys.get(stage) != inputs:
+                # forget this and the later stages until they have run, in case one fails
+                for later, laterInputs in stages[i:]:
+                    self.stageKeys.pop(later, None)
+                self.runStats.lap(stage)
+                self.runStage(stage,status,STAGES_PERCENT*i/len(stages))
+                self.stageKeys[stage] = inputs
+                self.stageRuns.append(stage)
+            if stage == through:
+                break
+        return self.stageRuns
+
+    def runStage(self,stage,status=None,percent=None):
+        if stage == 'climate':
+            # pass info back to UI status bar
+            self.showStatus(status,"Loading temperature data for period",stage,percent)
+            self.LoadTempDataRaw(status)
+        elif stage == 'masks':
+            self.showStatus(status,"Finding heating and cooling seasons",stage,percent)
+            self.seasonMasks()
+        elif stage == 'resistance':
+            self.showStatus(status,"Calculating home thermal resistance",stage,percent)
+            self.approxResistance()
+        elif stage == 'hourly':
+            if len(self.HPChoice)>0:
+                self.showStatus(status,"Analyzing heat pump performance",stage,percent)
+                self.heatPumpPerformance(0,status)
+            elif self.SuppHeatType != self.BaseHeatType:
+                self.showStatus(status,"Analyzing supplemental system performance",stage,percent)
+                self.heatPumpPerformance(0,status)
+        elif stage == 'rollup':
+            self.showStatus(status,"Totaling yearly results",stage,percent,self.t_End-self.t_Start)
+            self.yearlyRollup()
+
+    def referenceYear(self,year,status=None):
+        # The totals of a reference year which do not depend on prices: the year is analyzed with its own temperature
+        # data (replacing that of the period, which doHeatPumpAnalysis puts back) when the settings of the stages up
+        # to the hourly performance have changed since it was last analyzed, and otherwise the totals are kept from
+        # then, so a change of prices only recalculates the savings.
+        inputs = (tuple(inputs for stage, inputs in self.stageInputs() if stage != 'rollup'), year)
+        stored = self.referenceTotals.get(year)
+        if stored is not None and stored[0] == inputs:
+            RunStats.counters['referenceYearsReused'] += 1
+            return stored[1]
+
+        # forget the year until it has been analyzed, in case that fails
+        self.referenceTotals.pop(year, None)
+        self.LoadTempDataRaw(status,year)
+        self.heatPumpPerformance(year,status)
+        years = np.asarray(self.timeArray1, dtype='datetime64[s]').astype('datetime64[Y]').astype(int) + 1970
+        totals = dict(baseUnits=self.BaseUnitsByYear[0], heatPumpKWh=self.KWhByYear[0], suppUnits=self.SuppUnitsByYear[0],
+                      baselineACKWh=self.BLAC_KWhByYear[0], heatPumpACKWh=self.HPAC_KWhByYear[0],
+                      totalRequiredHeating=self.totalRequiredHeating,
+                      # the heat required each hour of the year, for the baseline cost at the price of each analysis
+                      heat=np.asarray(self.Q_required1, dtype=float)[years == year])
+        self.referenceTotals[year] = (inputs, totals)
+        self.stageRuns.append('reference')
+        return totals
+
+    def heatPumpWaterUnits(self):
+        # yearly electricity (KWh) used by the heat pump water heater
+        HPWaterUnits = 0
+        if self.HPWaterHeaterCOP>0:
+            HPWaterUnits = 12.*self.WaterHeatMonthlyUsage*self.WaterEnergyContent/ENERGY_CONTENT_ELEC/self.HPWaterHeaterCOP
+            if self.WaterHeatCombinedBill:
+                HPWaterUnits *= self.BaseHvacEfficiency
+        return HPWaterUnits
+
+    def yearlyRollup(self):
+        # Energy, cost and emissions for each full year of the analysis period (the rows of the results table, in
+        # yearlyResults), and the savings and CO2 impact over the period (analysisSummary)
+        self.analysisSummary = {}
+        self.yearlyResults = []
+
+        totSavings = totBaseEmissions = totHPEmissions = totSuppEmissions = 0.
+        totHPACEmissions = totBLACEmissions = 0.0
+        totHPHWEmissions = totBLHWEmissions = 0.0
+    
+        BLAC = self.BaselineAC != 0 and self.SummerBLSetPoint> 0
+        HPAC = self.SummerHPSetPoint>0
+
         startYear = self.t_Data[self.t_Start].year
         endYear = self.t_Data[self.t_End].year
         for year in range(startYear+1,endYear+1):     # first and last years tend to be truncated, with potentially misleading results
             Y = year-startYear
 
-            resultline = "%d\t%.0f\t$%.0f\t" % (year,self.BaseUnitsByYear[Y],self.BaseCostByYear[Y])
+            yearResult = dict(year=year, baseUnits=self.BaseUnitsByYear[Y], baseCost=self.BaseCostByYear[Y],
+                              waterUnits=None, waterCost=None, baselineACKWh=None, baselineACCost=None,
+                              heatPumpKWh=None, heatPumpCost=None, COP=None, hpWaterKWh=None, hpWaterCost=None,
+                              suppUses=None, suppUnits=None, suppCost=None, heatPumpACKWh=None, heatPumpACCost=None)
             waterUsage = 12.*self.WaterHeatMonthlyUsage
             if waterUsage>0:
                 if self.WaterHeatType==self.BaseHeatType:
@@ -900,36 +1161,24 @@ class HeatPumpAnalysis :
                 else:
                     waterCost = 0
                     print("WaterHeatType="+self.WaterHeatType)
-                resultline += "%.0f\t$%.0f\t" % (waterUsage,waterCost )  
+                yearResult.update(waterUnits=waterUsage, waterCost=waterCost)
             if BLAC and (len(self.HPChoice)>0):
-                resultline += "%.0f\t$%.0f\t" % (self.BLAC_KWhByYear[Y],self.BLAC_KWhByYear[Y]*self.STANDARD_PRICE_ELEC)
-        
-            resultline += " |  "
+                yearResult.update(baselineACKWh=self.BLAC_KWhByYear[Y], baselineACCost=self.BLAC_KWhByYear[Y]*self.STANDARD_PRICE_ELEC)
 
             if len(self.HPChoice)>0:
                 COPAve = self.BaseUnitsByYear[Y]*self.BaseHvacEfficiency*(self.BaseEnergyContent/ENERGY_CONTENT_ELEC)/self.KWhByYear[Y]
-                resultline += "%.0f\t$%.0f\t%.1f\t" % (self.KWhByYear[Y],self.KWhByYear[Y]*self.STANDARD_PRICE_ELEC,COPAve)
+                yearResult.update(heatPumpKWh=self.KWhByYear[Y], heatPumpCost=self.KWhByYear[Y]*self.STANDARD_PRICE_ELEC, COP=COPAve)
 
-            HPWaterUnits = 0
+            HPWaterUnits = self.heatPumpWaterUnits()
             if self.HPWaterHeaterCOP>0:
-                HPWaterUnits = 12.*self.WaterHeatMonthlyUsage*self.WaterEnergyContent/ENERGY_CONTENT_ELEC/self.HPWaterHeaterCOP
-                if self.WaterHeatCombinedBill:
-                    HPWaterUnits *= self.BaseHvacEfficiency
-                resultline += "%.0f\t$%.0f\t" % (HPWaterUnits,HPWaterUnits*self.STANDARD_PRICE_ELEC)
-
-            resultline += " |  "
+                yearResult.update(hpWaterKWh=HPWaterUnits, hpWaterCost=HPWaterUnits*self.STANDARD_PRICE_ELEC)
 
             if len(self.HPChoice)>0 or self.SuppHeatType!=self.BaseHeatType:
-                resultline += "%d\t%.0f\t$%.0f\t" % (self.SuppUsesByYear[Y],self.SuppUnitsByYear[Y],                
-                                                    self.SuppUnitsByYear[Y]*self.SuppCostPerUnit)
-        
-                if len(self.HPChoice)>0:
-                    if HPAC:
-                        resultline += "%.0f\t$%.0f" % (self.HPAC_KWhByYear[Y],self.HPAC_KWhByYear[Y]*self.STANDARD_PRICE_ELEC)
-            
-            resultline += "\n"
-            
-            results += resultline
+                yearResult.update(suppUses=self.SuppUsesByYear[Y], suppUnits=self.SuppUnitsByYear[Y], suppCost=self.SuppUnitsByYear[Y]*self.SuppCostPerUnit)
+                if len(self.HPChoice)>0 and HPAC:
+                    yearResult.update(heatPumpACKWh=self.HPAC_KWhByYear[Y], heatPumpACCost=self.HPAC_KWhByYear[Y]*self.STANDARD_PRICE_ELEC)
+
+            self.yearlyResults.append(yearResult)
 
             if len(self.HPChoice)>0 or self.SuppHeatType!=self.BaseHeatType:
                 totSavings += self.BaseCostByYear[Y] - (self.KWhByYear[Y]*self.STANDARD_PRICE_ELEC + self.SuppUnitsByYear[Y]*self.SuppCostPerUnit) 
@@ -948,11 +1197,6 @@ class HeatPumpAnalysis :
                 totHPACEmissions += self.HPAC_KWhByYear[Y]*self.ElecKgCO2PerUnit
             totHPHWEmissions += HPWaterUnits*self.ElecKgCO2PerUnit
     
-        if totSavings>0 :
-            savingsImpact = "saved"
-        else:
-            savingsImpact = "cost an additional"
-        
         CO2_percent_impact = 0
         if len(self.HPChoice)>0 or self.SuppHeatType!=self.BaseHeatType:
             CO2_percent_impact += (100.*(totBaseEmissions  - totHPEmissions - totSuppEmissions))
@@ -961,10 +1205,6 @@ class HeatPumpAnalysis :
         if totHPHWEmissions > 0:
             CO2_percent_impact += 100.*(totBLHWEmissions - totHPHWEmissions)
         CO2_percent_impact /= (totBaseEmissions+totBLACEmissions+totBLHWEmissions)
-        if CO2_percent_impact>0 : 
-            CO2Impact = "less"
-        else:
-            CO2Impact = "more"
 
         if len(self.HPChoice)>0:
             change = "heat pump system"
@@ -972,124 +1212,50 @@ class HeatPumpAnalysis :
             change = "heat pump water heater"
         elif self.SuppHeatType!=self.BaseHeatType:
             change = "change to "+self.SuppHeatType
-        results += "\nOver the years %d-%d, the %s would have %s $%.0f, emitting %.0f%% %s CO2eq than %s\n" % (startYear+1,endYear-1,change,savingsImpact, abs(totSavings), CO2_percent_impact, CO2Impact,self.BaseHeatType)
-
-        analyzeExtremes = True
-        if len(self.HPChoice)>0 and analyzeExtremes:
-            # BHN 7/20/17 - update prices for baseline and supplemental heat to be the standard price set from the Fuel Options page
-            self.UpdatePrices()
-
-            for year in (AverageHDDYear, HighestHDDYear) :
-            # average year first
-                self.LoadTempDataRaw(status,year)
-                self.heatPumpPerformance(year)
-
-                totBaseEmissions = self.BaseKgCO2PerUnit*self.BaseUnitsByYear[0]
-                totBLHWEmissions = self.WaterKgCO2PerUnit*waterUsage
-                totBLACEmissions = self.BLAC_KWhByYear[0]*self.ElecKgCO2PerUnit
-                totHPEmissions   = self.ElecKgCO2PerUnit*self.KWhByYear[0]
-                totHPACEmissions = self.HPAC_KWhByYear[0]*self.ElecKgCO2PerUnit
-                totHPHWEmissions = HPWaterUnits*self.ElecKgCO2PerUnit
-                totSuppEmissions = self.SuppKgCO2PerUnit*self.SuppUnitsByYear[0]
-
-                totSavings = self.BaseCostByYear[0] - (self.KWhByYear[0]*self.STANDARD_PRICE_ELEC + self.SuppUnitsByYear[0]*self.SuppCostPerUnit) 
-                if BLAC or HPAC :
-                    totSavings += (self.BLAC_KWhByYear[0]-self.HPAC_KWhByYear[0]) * self.STANDARD_PRICE_ELEC
-                # Bug fix: add hot water heater savings for average and coldest years
-                if self.HPWaterHeaterCOP>0:
-                    totSavings += 12.*self.WaterHeatMonthlyUsage * self.WaterCostPerUnit - HPWaterUnits*self.STANDARD_PRICE_ELEC
-                if totSavings>0 :
-                    savingsImpact = "saved"
-                else:
-                    savingsImpact = "cost an additional"
-    
-                CO2_percent_impact = (100.*(totBaseEmissions + totBLACEmissions - totHPEmissions - totSuppEmissions- totHPACEmissions))
-                if totHPHWEmissions > 0:
-                    CO2_percent_impact += 100.*(totBLHWEmissions - totHPHWEmissions)
-                CO2_percent_impact /= (totBaseEmissions+totBLACEmissions+totBLHWEmissions)
-            
-                if CO2_percent_impact>0 : 
-                    CO2Impact = "less"
-                else:
-                    CO2Impact = "more"
-    
-                percentOfLoad = 100.* (self.totalRequiredHeating  - self.SuppUnitsByYear[0]*self.SuppEnergyContent)/self.totalRequiredHeating
-            
-                if year == AverageHDDYear:
-                    self.HeatPumpAverageUnits = self.KWhByYear[0] + self.HPAC_KWhByYear[0]
-                    self.BaseAverageUnits = self.BaseUnitsByYear[0]
-                    if self.HPWaterHeaterCOP>0 :
-                        self.HeatPumpAverageUnits += HPWaterUnits
-                        self.BaseAverageUnits += waterUsage
-                    if BLAC:
-                        self.BLACAverageUnits = self.BLAC_KWhByYear[0]
-                    else:
-                        self.BLACAverageUnits = 0.
-                    
-                    self.SuppAverageUnits = self.SuppUnitsByYear[0]
-                    adj = "Average"
-                else:
-                    adj = "Coldest"
-                results += "%s heating year (%d), heat pump covers " % (adj,year)
-                results += "%.1f%% of heating load, %s $%.0f, " % (percentOfLoad,savingsImpact,abs(totSavings))
-                results += "emits %.0f%% %s CO2 than %s\n" % (CO2_percent_impact,CO2Impact,self.BaseHeatType)
-            
-            self.updateTemp = True
-
-        status.config(text="Saving results")
-        status.update()
-        self.outputData(results)
-
-        if len(self.HPChoice)>0:
-            self.updateGraph = True
-
-        return results
+        self.analysisSummary = dict(change=change, baseHeatType=self.BaseHeatType, suppHeatType=self.SuppHeatType,
+                                    firstYear=startYear+1, lastYear=endYear-1, savings=totSavings, CO2PercentImpact=CO2_percent_impact)
+
+    def analysisKey(self):
+        # key of everything the results of doHeatPumpAnalysis depend on, for the result cache
+        heatPumps = [(hp.AHRICertNumber, hp.Manufacturer, hp.ModelName, hp.OutdoorUnit, hp.IndoorUnits, hp.SEER,
+                      hp.tData.tolist(), hp.CAPMin.tolist(), hp.CAPMax.tolist(), hp.COPMin.tolist(), hp.COPMax.tolist())
+                     for hp in self.HPChoice]
+        return resultKey(self.purchase_Date, self.purchase_Quantity, self.purchase_Cost,
+                         [getattr(self, name) for name in ANALYSIS_INPUTS], heatPumps,
+                         ClimateData.stationFingerprint(self.workingDirectory + 'Climate Data'))
         
-    def isHeating(self,t) :
-# Author: Jonah Kadoko
-# this function determines if the heat pump should heat the room at this particular time
-# Reasons why your heat pump may not turn ON include, but not limited to the following,:
-# 1, The outdoor temp is lower than the min operating temp of the heat pump
-# 2, It is in the summer time before your specified turn_ON_Date and after the turn_OFF_Date
-# 3, The heat pump overshoot for that particular hour and so is cycling (not much modelling has been done to simumlate cycling)
-
-        if self.t_Data[t] <= datetime.datetime(self.t_Data[t].year, self.turn_OFF_Date.month, self.turn_OFF_Date.day) :
-            self.current_Heating_Year = self.t_Data[t].year - 1    
-        else:
-            self.current_Heating_Year = self.t_Data[t].year
-    
-        self.yr_Turn_OFF = datetime.datetime(self.current_Heating_Year + 1, self.turn_OFF_Date.month, self.turn_OFF_Date.day)
-        self.yr_Turn_ON = datetime.datetime(self.current_Heating_Year, self.turn_ON_Date.month, self.turn_ON_Date.day)
-
-#    if (t_Data[t_Start] <= t_Data[t]) and (t_Data[t] <= yr_Turn_OFF) and \
-#    (yr_Turn_ON <= t_Data[t]) and (t_Data[t] <= t_Data[t_End]) and (T_Outdoor[t] < WinterHPSetPoint) :
-        if (self.t_Data[t] <= self.yr_Turn_OFF) and (self.yr_Turn_ON <= self.t_Data[t]) and (self.T_Outdoor[t] < self.WinterHPSetPoint) :
-        # t is within range of the heating period and purchase period and the outdoor temperature is below the indoor temperature
-            return True
-        else:
-            return False    
-            
-    def isCooling(self,t) :
+    def seasonMasks(self):
+    # Author: Jonah Kadoko (isHeating, isCooling), as boolean masks over all of t_Data
+    # heating: the heat pump should heat the room at this particular time
+    #   it is within the heating season (after the turn_ON_Date and before the turn_OFF_Date),
+    #   and the outdoor temperature is below the winter set point
+    # cooling: the outdoor temperature is above the summer set point
+    # The masks are built once, and rebuilt only when the temperature data, the turn on/off dates
+    # or the set points change.
+        key = (self.turn_ON_Date, self.turn_OFF_Date, self.WinterHPSetPoint, self.SummerHPSetPoint)
+        if self.heatingMask is None or self.maskData is not self.t_Array or self.maskKey != key:
+            years = self.t_Array.astype('datetime64[Y]').astype(int) + 1970
+            if len(years)>0:
+                # the heating season runs up to the turn off date, and from the turn on date, of each calendar year
+                seasonYears = range(years[0], years[-1]+1)
+                yrTurnOFF = np.array([datetime.datetime(y, self.turn_OFF_Date.month, self.turn_OFF_Date.day) for y in seasonYears], dtype='datetime64[s]')
+                yrTurnON = np.array([datetime.datetime(y, self.turn_ON_Date.month, self.turn_ON_Date.day) for y in seasonYears], dtype='datetime64[s]')
+                iy = years - years[0]
+                season = (self.t_Array <= yrTurnOFF[iy]) | (self.t_Array >= yrTurnON[iy])
+            else:
+                season = np.zeros(0, dtype=bool)
 
-# this function determines if the cooling should be applied at this time
-# Reasons why your heat pump may not turn ON include, but not limited to the following,:
-# 1, The outdoor temp is lower than the min operating temp of the heat pump
-# 2, It is in the summer time before your specified turn_ON_Date and after the turn_OFF_Date
-# 3, The heat pump overshoot for that particular hour and so is cycling (not much modelling has been done to simumlate cycling)
+            self.heatingMask = season & (self.T_Array < self.WinterHPSetPoint)
+            self.coolingMask = self.T_Array > self.SummerHPSetPoint
+            self.maskData = self.t_Array
+            self.maskKey = key
+        return self.heatingMask, self.coolingMask
 
-        if self.t_Data[t] <= datetime.datetime(self.t_Data[t].year, self.turn_OFF_Date.month, self.turn_OFF_Date.day) :
-            self.current_Heating_Year = self.t_Data[t].year - 1    
-        else:
-            self.current_Heating_Year = self.t_Data[t].year
-    
-        self.yr_Turn_OFF = datetime.datetime(self.current_Heating_Year + 1, self.turn_OFF_Date.month, self.turn_OFF_Date.day)
-        self.yr_Turn_ON = datetime.datetime(self.current_Heating_Year, self.turn_ON_Date.month, self.turn_ON_Date.day)
+    def isHeating(self,t) :
+        return bool(self.seasonMasks()[0][t])
 
-        if (self.T_Outdoor[t] > self.SummerHPSetPoint) :
-        # t is within range of the heating period and purchase period and the outdoor temperature is below the indoor temperature
-            return True
-        else:
-            return False        
+    def isCooling(self,t) :
+        return bool(self.seasonMasks()[1][t])
     
     def approxResistance(self):
     # Adapted from VBA project, Author: Jonah Kadoko
@@ -1104,27 +1270,32 @@ class HeatPumpAnalysis :
             p+=1
             if p==self.numDeliveries: break
 
-        t = 0    
         self.t_Start = self.t_End = 0
  
         p = self.numDeliveries-1
         self.last_Purchase = p
         if self.purchase_Quantity[p] == 0 :
             self.last_Purchase = p - 1
-    
-        while t<len(self.t_Data):    # (t_Start == 0) or (t_End == 0):
-            if (self.t_Start==0):
-                if self.purchase_Date[0] == self.t_Data[t].date() :
-                # All calculations should start a day after the customer fills up their tank around the start of the year
-                # t_Start is the index of the time the customer fi
-                    self.t_Start = t
-
-            elif (self.t_End==0 and self.purchase_Date[self.last_Purchase] == self.t_Data[t].date()) :
-            # calculations should stop at the last purchase date of the year
-                self.t_End = t
-                break
 
-            t = t + 1
+        # delivery dates are located in the hourly data with a binary search on the day of each hour
+        tDays = self.t_Array.astype('datetime64[D]')
+        nHours = len(tDays)
+
+        # All calculations should start a day after the customer fills up their tank around the start of the year
+        # t_Start is the index of the first hour of the first purchase date (as the hourly scan found it:
+        # a match in the very first hour only counts from the second hour of that day)
+        firstDate = np.datetime64(self.purchase_Date[0], 'D')
+        t = np.searchsorted(tDays, firstDate)
+        if t==0 and nHours>1 and tDays[1]==firstDate:
+            t = 1
+        if 0<t<nHours and tDays[t]==firstDate:
+            self.t_Start = int(t)
+
+            # calculations should stop at the last purchase date of the year
+            lastDate = np.datetime64(self.purchase_Date[self.last_Purchase], 'D')
+            t = max(np.searchsorted(tDays, lastDate), self.t_Start+1)
+            if t<nHours and tDays[t]==lastDate:
+                self.t_End = int(t)
 
         if self.t_End==0 :
             self.t_End = len(self.t_Data)-1
@@ -1137,11 +1308,14 @@ class HeatPumpAnalysis :
             self.BaseUnitsByYear.append(0.0)
             self.BaseCostByYear.append(0.0)
 
-        # Calculate total annual delta T
+        heating, cooling = self.seasonMasks()
+
+        # Calculate total annual delta T (accumulated in time order, as an hourly sum would be)
+        heatingHours = self.t_Start + np.flatnonzero(heating[self.t_Start:self.t_End])
+        deltaT = self.WinterHPSetPoint - self.T_Array[heatingHours]
         delta_T = 0.0
-        for t in range(self.t_Start,self.t_End) :
-            if self.isHeating(t):
-                delta_T = delta_T + (self.WinterHPSetPoint - self.T_Outdoor[t])
+        if len(deltaT)>0:
+            delta_T = float(np.cumsum(deltaT)[-1])
 
         # Calculate the total oil used
         total_Vol = 0.0
@@ -1165,11 +1339,11 @@ class HeatPumpAnalysis :
                 self.BaseCostByYear[Y] += self.purchase_Cost[p]*(Quantity_Used/self.purchase_Quantity[p])
 
         # Calculate the average resistance per heating period
-        p = 0
-        self.approx_Resistance[0][0] = self.t_Start
-        self.approx_Resistance[0][1] = 0.0
-        for t in range(self.t_Start,self.t_End):
-        
+        # Only heating hours contribute: those dated within the current purchase period are summed into it,
+        # and the first one dated after it starts the next period (one period per hour, as in the hourly scan).
+        # The periods are found by binary search on the dates of the heating hours, so the cost scales
+        # with the number of deliveries rather than hours x deliveries.
+        def QuantityUsed(p):
             if self.BaseHeatType == self.WaterHeatType and self.WaterHeatMonthlyUsage>0 and p<len(self.purchase_Date)-2 :
                 purchasePeriod = (self.purchase_Date[p+1] - self.purchase_Date[p])
                 days = purchasePeriod.days
@@ -1177,24 +1351,33 @@ class HeatPumpAnalysis :
                 WaterFuelInPeriod = self.WaterHeatMonthlyUsage * months
             else:
                 WaterFuelInPeriod = 0.
-            Quantity_Used = (self.purchase_Quantity[p]-WaterFuelInPeriod)
+            return (self.purchase_Quantity[p]-WaterFuelInPeriod)
 
-            ti = t-self.t_Start
-            dateTime = self.t_Data[t]
-            year = dateTime.year
-            Y = year - startYear
-        
-            thisDate = self.t_Data[t].date()
-            if self.isHeating(t) and (self.purchase_Date[p] <= thisDate) and (thisDate <= self.purchase_Date[p + 1]) and (p<self.last_Purchase):
+        heatingDays = tDays[heatingHours]
+        purchaseDays = np.array(self.purchase_Date, dtype='datetime64[D]')
+        lastDate = purchaseDays[self.last_Purchase] if self.last_Purchase>=0 else None
+        p = 0
+        self.approx_Resistance[0][0] = self.t_Start
+        self.approx_Resistance[0][1] = 0.0
+        k = 0
+        while p<self.last_Purchase and k<len(heatingHours):
+            Quantity_Used = QuantityUsed(p)
+            
+            # Sum app eligible delta_T during each heating period
+            lo = max(k, np.searchsorted(heatingDays, purchaseDays[p], side='left'))
+            hi = np.searchsorted(heatingDays, purchaseDays[p+1], side='right')
+            if hi>lo:
+                terms = deltaT[lo:hi] / (self.BaseHvacEfficiency * Quantity_Used * self.BaseEnergyContent)
+                self.approx_Resistance[p][1] = float(np.cumsum(np.concatenate(([self.approx_Resistance[p][1]], terms)))[-1])
+            k = max(k, hi)
+            if k>=len(heatingHours) or heatingDays[k]>lastDate:
+                break
 
-                # Sum app eligible delta_T during each heating period
-                self.approx_Resistance[p][1] += (self.WinterHPSetPoint - self.T_Outdoor[t]) / (self.BaseHvacEfficiency * Quantity_Used * self.BaseEnergyContent)
-            else:
-                if self.isHeating(t) and (self.purchase_Date[p + 1] <= thisDate) and (thisDate <= self.purchase_Date[self.last_Purchase]) and (p < self.last_Purchase): 
-                # this particular time sample belongs to the next purchase period
-                    p = p + 1
-                    self.approx_Resistance[p][0] = t
-                    self.approx_Resistance[p][1] =  (self.WinterHPSetPoint - self.T_Outdoor[t]) / (self.BaseHvacEfficiency * Quantity_Used * self.BaseEnergyContent)
+            # this particular time sample belongs to the next purchase period
+            p = p + 1
+            self.approx_Resistance[p][0] = int(heatingHours[k])
+            self.approx_Resistance[p][1] =  float(deltaT[k]) / (self.BaseHvacEfficiency * Quantity_Used * self.BaseEnergyContent)
+            k = k + 1
  
     # Average resistance during the heating period
         self.average_Resistance = delta_T / (self.BaseHvacEfficiency * self.BaseEnergyContent * total_Vol)
@@ -1209,13 +1392,16 @@ class HeatPumpAnalysis :
 #        print(debugMessage)
         
 
-    def heatPumpPerformance(self,h):
+    def heatPumpPerformance(self,h,status=None):
     #Author: Jonah Kadoko
     #this function calculates the approximate min, and max heating capacity, COPave and average electrical consumption
     #One would expect that the required heat be in between the max and min heating capacities
 
 # argument h: 0 - analyze data for the years provided
 #             other - analyze performance for year h
+        if self.arrayEngine:
+            return self.heatPumpPerformanceArray(h)
+
         use_Average_R = True
     
         p = 0
@@ -1256,6 +1442,13 @@ class HeatPumpAnalysis :
             self.BaseUnitsByYear[0] = 0.
             self.BaseCostByYear[0] = 0.
  
+        heating, cooling = self.seasonMasks()
+
+        RunStats.counters['hoursSimulated'] += self.t_End-self.t_Start
+        # the four interpolations of the performance of each unit (MaxCapacity...) each hour, counted here
+        # rather than in the HeatPump methods so as not to slow them
+        RunStats.counters['pointInterpolations'] += 4*len(self.HPChoice)*(self.t_End-self.t_Start)
+
         supplementalLastDate = self.t_Data[0]   # for determining how many supplemental days there are
         oldYear = 1900
 
@@ -1274,6 +1467,7 @@ class HeatPumpAnalysis :
         
             if year > oldYear:
                 oldYear = year
+                self.showStatus(status,"Analyzing heat pump performance for %d" % year,hours=ti)
                 self.KWhByYear.append(0.0)
                 self.SuppUnitsByYear.append(0.0)
                 self.SuppUsesByYear.append(0)
@@ -1300,10 +1494,10 @@ class HeatPumpAnalysis :
                 COP_Min.append(hp.COPatMinCapacity(temp))
                 COP_Max.append(hp.COPatMaxCapacity(temp))
 
-            if self.isHeating(t):
+            if heating[t]:
                 heating_required = (self.WinterHPSetPoint - temp)/ resistance
                 cooling_required = 0.            
-            elif self.isCooling(t):
+            elif cooling[t]:
                 heating_required = 0.
                 cooling_required = (temp - self.SummerHPSetPoint)/ resistance
 
@@ -1404,6 +1598,335 @@ class HeatPumpAnalysis :
                  
                 if HPSEER>0.:
                     self.HPAC_KWhByYear[Y] += cooling_required / HPSEER/1000.
+
+    def heatPumpSystem(self):
+        # combined performance of the chosen heat pumps, rebuilt only when the selection changes
+        if self.HPSystem is None or self.HPSystem.units != self.HPChoice:
+            self.HPSystem = HeatPumpSystem(self.HPChoice)
+        return self.HPSystem
+
+    def heatingHourGroups(self):
+        # The hours of the results table years (see yearlyRollup) grouped by temperature and heating load, for
+        # evaluating many heat pump systems at once.  The heating load is that of heatPumpPerformanceArray.
+        # Returns the distinct temperatures, and for each group the index of its temperature among them, its
+        # temperature, its heating load and its number of hours.
+        startYear = self.t_Data[self.t_Start].year
+        endYear = self.t_Data[self.t_End].year
+        temp = self.T_Array[self.t_Start:self.t_End]
+        years = self.t_Array[self.t_Start:self.t_End].astype('datetime64[Y]').astype(int) + 1970
+        nHours = len(temp)
+        heatingMask, coolingMask = self.seasonMasks()
+        heating = heatingMask[self.t_Start:self.t_End]
+        cooling = ~heating & coolingMask[self.t_Start:self.t_End]
+        heatLoad = np.where(heating, (self.WinterHPSetPoint - temp)/ self.average_Resistance, 0.)
+        last = np.maximum.accumulate(np.where(heating | cooling, np.arange(nHours), -1)) if nHours>0 else np.zeros(0, dtype=int)
+        heating_required = np.where(last>=0, heatLoad[last], 0.)
+
+        inYears = (years>startYear) & (years<=endYear)
+        tempValues, tempIndex = np.unique(temp[inYears], return_inverse=True)
+        loadValues, loadIndex = np.unique(heating_required[inYears], return_inverse=True)
+        groups, hours = np.unique(tempIndex.astype(np.int64)*len(loadValues) + loadIndex, return_counts=True)
+        groupTemp = groups // len(loadValues)
+        return tempValues, groupTemp, tempValues[groupTemp], loadValues[groups % len(loadValues)], hours
+
+    def systemHeating(self,performance,numUnits,T,Q,hours):
+        # Heat pump KWh, supplemental units and supplemental heat (BTU) of heat pump systems over groups of hours
+        # (see heatingHourGroups), as in heatPumpPerformanceArray.  performance: the combined MaxCapacity,
+        # MinCapacity, COPatMaxCapacity and COPatMinCapacity of each system (see HeatPumpSystem) for each group,
+        # as a (4, systems, groups) array; numUnits: the number of units of the systems.
+        CAP_Max, CAP_Min, COP_Max, COP_Min = performance
+        suppOnly = T<self.SuppOutdoorTempNABL
+        overCap = ~suppOnly & (Q > CAP_Max)
+        underCap = ~suppOnly & ~overCap
+        belowMin = underCap & (Q < CAP_Min)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            COPave = np.where(overCap, COP_Max, np.where(belowMin, COP_Min,
+                              numUnits*COP_Min + ((Q - CAP_Min) * (COP_Max - COP_Min)) / (CAP_Max - CAP_Min)))
+            electric_required = np.where(overCap, CAP_Max, np.where(underCap, Q, 0.)) / COPave / ENERGY_CONTENT_ELEC
+        electric_required[~(overCap | underCap)] = 0.
+        supplemental_required = np.where(suppOnly, Q, np.where(overCap, Q - CAP_Max, 0.))
+
+        supplemental = supplemental_required @ hours
+        return electric_required @ hours, supplemental/self.SuppHvacEfficiency/self.SuppEnergyContent, supplemental
+
+    def screenHeatPumps(self,units=None,status=None):
+    # Heating performance of each heat pump in the catalog (or the catalog rows in units) as the only unit of the
+    # system, for the home and settings of the analysis, ranked by heating cost (cheapest first).  The hourly
+    # analysis of heatPumpPerformanceArray is done for all units at once, for the hours of the period grouped by
+    # their temperature and heating load (heatingHourGroups).
+    # Returns a row for each unit with its totals over the years of the results table (as the savings):
+    # heatPumpKWh, suppUnits, heatPumpCost + suppCost = cost, coverage (% of the heating load from the heat
+    # pump), and savings against the baseline heating cost.
+        if len(self.purchase_Date)<=0 :
+            return []
+        self.runStages(status, through='resistance')
+        rows = np.arange(len(self.HPList)) if units is None else np.asarray(units, dtype=int)
+        self.showStatus(status,"Screening %d heat pumps" % len(rows))
+
+        tempValues, groupTemp, T, Q, hours = self.heatingHourGroups()
+        performance = self.catalog.performanceTables(tempValues, rows)[:, :, groupTemp]
+        KWh, suppUnits, supplemental = self.systemHeating(performance, 1, T, Q, hours)
+        totalRequired = Q @ hours
+        coverage = 100.*(totalRequired - supplemental)/totalRequired if totalRequired>0 else np.zeros(len(rows))
+        startYear = self.t_Data[self.t_Start].year
+        endYear = self.t_Data[self.t_End].year
+        baseCost = float(np.sum(self.BaseCostByYear[1:endYear-startYear+1]))
+
+        results = []
+        for i, row in enumerate(rows.tolist()):
+            hp = self.HPList[row]
+            heatPumpCost = KWh[i]*self.STANDARD_PRICE_ELEC
+            suppCost = suppUnits[i]*self.SuppCostPerUnit
+            results.append(dict(index=row, AHRICertNumber=hp.AHRICertNumber, Brand=hp.Brand, OutdoorUnit=hp.OutdoorUnit,
+                                DuctedDuctless=hp.DuctedDuctless, Zones=hp.Zones, heatPumpKWh=float(KWh[i]), heatPumpCost=float(heatPumpCost),
+                                suppUnits=float(suppUnits[i]), suppCost=float(suppCost), cost=float(heatPumpCost+suppCost),
+                                coverage=float(coverage[i]), savings=float(baseCost-heatPumpCost-suppCost)))
+        # units whose listing gives no usable performance (NaN results) last
+        results.sort(key=lambda r: (np.isnan(r['cost']), r['cost']))
+        return results
+
+    def optimizeHeatPumps(self,maxUnits=2,ductless=None,zones=None,objective='cost',designTemp=None,unitCost=0.,
+                          years=20,top=10,minimal=False,status=None):
+    # Search the combinations of up to maxUnits catalog units (repeats allowed, as in HPChoice) for the best heat
+    # pump system for the home, among the units which are ductless (ductless=True) or ducted (False), and single-
+    # or multi-zone (zones='single' or 'multi'), or all of them (None).
+    # Only systems whose summed MaxCapacity at the design temperature covers the design heating load are
+    # considered, and all of them are: a system which covers the load is still extended (up to maxUnits), as more
+    # capacity can cover more of the load, or need less supplemental fuel.  designTemp defaults to the 99% design
+    # temperature of the period (the hourly temperature exceeded in 99% of the heating season hours).
+    # Combinations are enumerated from the largest units down, and a branch is left as soon as the remaining
+    # units cannot reach the design load.  minimal=True keeps the search small by considering only the systems
+    # which need each of their units to cover the load (a system which covers it is not extended).
+    # objective 'cost': lowest lifetime cost, the installed cost (unitCost per unit) plus the heating cost over
+    # the years with the inflation rates of the economics page; 'coverage': largest share of the heating load
+    # from the heat pumps (then lowest lifetime cost).
+    # Returns the best (top) systems, each with its catalog rows (units) and results as in screenHeatPumps.
+        if len(self.purchase_Date)<=0 :
+            return []
+        self.runStages(status, through='resistance')
+        candidates = self.catalog.query(ductless=ductless, zones=zones)
+
+        tempValues, groupTemp, T, Q, hours = self.heatingHourGroups()
+        if designTemp is None:
+            heatingMask, coolingMask = self.seasonMasks()
+            seasonTemps = self.T_Array[self.t_Start:self.t_End][heatingMask[self.t_Start:self.t_End]]
+            designTemp = float(np.percentile(seasonTemps, 1.)) if len(seasonTemps)>0 else float(tempValues[0])
+        designLoad = (self.WinterHPSetPoint - designTemp)/self.average_Resistance
+
+        # the performance curves of each candidate over the groups of hours (candidates, 4, groups), made once,
+        # largest at design first
+        candidates = self.catalog.distinctRatings(candidates)
+        designCapacity = self.catalog.performanceTables([designTemp], candidates)[0, :, 0]
+        order = np.argsort(-designCapacity, kind='stable')
+        order = order[~np.isnan(designCapacity[order])]
+        candidates = candidates[order]
+        designCapacity = designCapacity[order]
+        curves = np.ascontiguousarray(self.catalog.performanceTables(tempValues, candidates)[:, :, groupTemp].transpose(1, 0, 2))
+
+        # systems which meet the design load, as rows of candidate positions in non-decreasing order (largest units
+        # first), for each number of units.  Each system of n units is extended by the candidates from its last one
+        # down to the smallest which, repeated for the units still to add, could reach the design load.
+        combinations = [np.zeros((0, n), dtype=int) for n in range(maxUnits+1)]
+        prefixes = np.zeros((1, 0), dtype=int)
+        capacity = np.zeros(1)
+        for n in range(1, maxUnits+1):
+            remaining = maxUnits - n + 1
+            start = prefixes[:, -1] if n>1 else np.zeros(len(prefixes), dtype=int)
+            stop = np.searchsorted(-designCapacity, -(designLoad - capacity)/remaining, side='right')
+            counts = np.maximum(stop - start, 0)
+            rows = np.repeat(np.arange(len(prefixes)), counts)
+            positions = np.arange(np.sum(counts)) - np.repeat(np.cumsum(counts) - counts - start, counts)
+            systems = np.column_stack((prefixes[rows], positions))
+            systemCapacity = capacity[rows] + designCapacity[positions]
+            meets = systemCapacity >= designLoad
+            combinations[n] = systems[meets]
+            extended = ~meets if minimal else np.ones(len(systems), dtype=bool)
+            prefixes = systems[extended]
+            capacity = systemCapacity[extended]
+        numSystems = np.sum([len(c) for c in combinations])
+        self.showStatus(status,"Evaluating %d heat pump systems" % numSystems)
+
+        # heating cost over the lifetime per unit of electricity and supplemental fuel, with inflation
+        elecFactor = np.sum([self.STANDARD_PRICE_ELEC*(1.+self.ElectricInflationRate)**i for i in range(years)])
+        suppFactor = np.sum([self.SuppCostPerUnit*(1.+self.SuppInflationRate)**i for i in range(years)])
+        startYear = self.t_Data[self.t_Start].year
+        endYear = self.t_Data[self.t_End].year
+        numYears = max(endYear - startYear, 1)
+        baseCost = float(np.sum(self.BaseCostByYear[1:endYear-startYear+1]))
+        totalRequired = Q @ hours
+
+        systems = []
+        values = []     # KWh, supplemental units, coverage and lifetime cost of each system, by batch
+        for numUnits in range(1, maxUnits+1):
+            # combined capacity and average COP of the units (see HeatPumpSystem): the capacities summed, and the
+            # COPs divided by the number of units and summed
+            unitCurves = curves / np.array([1., 1., numUnits, numUnits])[:, np.newaxis]
+            for first in range(0, len(combinations[numUnits]), 256):
+                batch = combinations[numUnits][first:first+256]
+                performance = unitCurves[np.array(batch)].sum(axis=1).transpose(1, 0, 2)
+                KWh, suppUnits, supplemental = self.systemHeating(performance, numUnits, T, Q, hours)
+                coverage = 100.*(totalRequired - supplemental)/totalRequired if totalRequired>0 else np.zeros(len(batch))
+                lifetimeCost = unitCost*numUnits + (KWh*elecFactor + suppUnits*suppFactor)/numYears
+                systems.extend(batch)
+                values.append(np.array([KWh, suppUnits, coverage, lifetimeCost]))
+        if len(systems)==0:
+            return []
+        KWh, suppUnits, coverage, lifetimeCost = np.concatenate(values, axis=1)
+
+        # best first, systems with no usable performance (NaN) last
+        if objective == 'coverage':
+            ranking = np.lexsort((lifetimeCost, -coverage, np.isnan(coverage)))
+        else:
+            ranking = np.lexsort((lifetimeCost, np.isnan(lifetimeCost)))
+
+        results = []
+        for i in ranking[:top]:
+            rows = candidates[systems[i]].tolist()
+            heatPumpCost = KWh[i]*self.STANDARD_PRICE_ELEC
+            suppCost = suppUnits[i]*self.SuppCostPerUnit
+            results.append(dict(units=rows, names="+".join(self.HPList[r].Brand+'-'+self.HPList[r].OutdoorUnit for r in rows),
+                                designTemp=designTemp, designLoad=float(designLoad), designCapacity=float(designCapacity[systems[i]].sum()),
+                                heatPumpKWh=float(KWh[i]), heatPumpCost=float(heatPumpCost), suppUnits=float(suppUnits[i]), suppCost=float(suppCost),
+                                cost=float(heatPumpCost+suppCost), coverage=float(coverage[i]), savings=float(baseCost-heatPumpCost-suppCost),
+                                lifetimeCost=float(lifetimeCost[i])))
+        return results
+
+    def heatPumpPerformanceArray(self,h):
+    # Whole-array version of the hourly loop in heatPumpPerformance: each quantity is calculated for all
+    # hours at once with NumPy, and the per-year totals are accumulated in the same order as the loop,
+    # so the results are identical (for several chosen units, to within floating point rounding of the
+    # combined COP - see HeatPumpSystem).
+    # argument h: 0 - analyze data for the years provided
+    #             other - analyze performance for year h
+        if h==0:
+            startYear = self.t_Data[self.t_Start].year
+        else:
+            startYear = h
+            self.t_Start = 0
+            self.t_End = len(self.t_Data)
+
+            self.BaseUnitsByYear[0] = 0.
+            self.BaseCostByYear[0] = 0.
+
+        tHours = self.t_Array[self.t_Start:self.t_End]
+        temp = self.T_Array[self.t_Start:self.t_End]
+        nHours = len(tHours)
+        RunStats.counters['hoursSimulated'] += nHours
+        years = tHours.astype('datetime64[Y]').astype(int) + 1970
+        if nHours>0:
+            numYears = years[-1] - startYear + 1
+        else:
+            numYears = 0
+
+        heatingMask, coolingMask = self.seasonMasks()
+        heating = heatingMask[self.t_Start:self.t_End]
+        cooling = ~heating & coolingMask[self.t_Start:self.t_End]
+
+        resistance = self.average_Resistance
+        heatLoad = np.where(heating, (self.WinterHPSetPoint - temp)/ resistance, 0.)
+        coolLoad = np.where(cooling, (temp - self.SummerHPSetPoint)/ resistance, 0.)
+
+        # hours which are neither heating nor cooling keep the load of the previous hour, as in the hourly loop
+        last = np.maximum.accumulate(np.where(heating | cooling, np.arange(nHours), -1)) if nHours>0 else np.zeros(0, dtype=int)
+        heating_required = np.where(last>=0, heatLoad[last], 0.)
+        cooling_required = np.where(last>=0, coolLoad[last], 0.)
+
+        # combined capacity and average COP of the chosen heat pumps, looked up in the system's
+        # performance table at the distinct temperatures of the period
+        np_ = len(self.HPChoice)
+        if np_>0:
+            tempValues, tempIndex = np.unique(temp, return_inverse=True)
+            CAP_Max, CAP_Min, COP_Max, COP_Min = self.heatPumpSystem().PerformanceTable(tempValues)[:, tempIndex]
+        else:
+            CAP_Max = CAP_Min = COP_Max = COP_Min = np.zeros(nHours)
+
+        # the three operating regimes of the hourly loop
+        if np_==0:
+            suppOnly = np.ones(nHours, dtype=bool)
+        else:
+            suppOnly = temp<self.SuppOutdoorTempNABL
+        overCap = ~suppOnly & (heating_required > CAP_Max)
+        underCap = ~suppOnly & ~overCap
+        belowMin = underCap & (heating_required < CAP_Min)
+        between = underCap & ~belowMin
+
+        COPave = np.zeros(nHours)
+        COPave[overCap] = COP_Max[overCap]
+        COPave[belowMin] = COP_Min[belowMin]
+        # as in the hourly loop, the COP at minimum capacity is summed over the units (not averaged)
+        # when the load is between the minimum and maximum capacity
+        COPave[between] = np_*COP_Min[between] + ((heating_required[between] - CAP_Min[between]) * (COP_Max[between] - COP_Min[between])) / (CAP_Max[between] - CAP_Min[between])
+
+        supplemental_required = np.zeros(nHours)
+        supplemental_required[suppOnly] = heating_required[suppOnly]
+        supplemental_required[overCap] = heating_required[overCap] - CAP_Max[overCap]
+
+        electric_required = np.zeros(nHours)
+        electric_required[overCap] = CAP_Max[overCap] / COPave[overCap]/ENERGY_CONTENT_ELEC
+        electric_required[underCap] = heating_required[underCap] / COPave[underCap]/ENERGY_CONTENT_ELEC
+
+        suppUsed = suppOnly | overCap
+        suppUnits = np.zeros(nHours)
+        suppUnits[suppUsed] = supplemental_required[suppUsed]/self.SuppHvacEfficiency/self.SuppEnergyContent
+
+        if h==0:
+            self.timeArray = tHours            # datetime64 hours (a list of datetimes in the hourly loop)
+            self.Q_required = heating_required
+            self.QC_required = cooling_required
+            self.capacity_Max = CAP_Max
+            self.capacity_Min = CAP_Min
+            self.electric_Required = electric_required
+            self.supplemental_Heat = supplemental_required
+            self.COP_Ave = np.zeros(nHours)
+        else:
+            self.timeArray1 = tHours
+            self.Q_required1 = heating_required
+            self.QC_required1 = cooling_required
+            self.capacity_Max1 = CAP_Max
+            self.capacity_Min1 = CAP_Min
+            self.electric_Required1 = electric_required
+            self.supplemental_Heat1 = supplemental_required
+            self.COP_Ave1 = np.zeros(nHours)
+
+        self.totalRequiredHeating = yearTotals(heating_required, np.zeros(nHours), 0, 1)[0]
+        self.totalRequiredCooling = yearTotals(cooling_required, np.zeros(nHours), 0, 1)[0]
+
+        # for analysis of average and extreme years, back-calculate what the baseline would have used
+        if h!=0:
+            self.BaseUnitsByYear[:numYears] = yearTotals(heating_required/self.BaseHvacEfficiency/self.BaseEnergyContent,
+                                                         years, startYear, numYears, self.BaseUnitsByYear)
+            self.BaseCostByYear[:numYears] = yearTotals(self.BaseCostPerUnit*heating_required/self.BaseHvacEfficiency/self.BaseEnergyContent,
+                                                        years, startYear, numYears, self.BaseCostByYear)
+
+        self.KWhByYear = yearTotals(electric_required, years, startYear, numYears)
+        self.SuppUnitsByYear = yearTotals(suppUnits, years, startYear, numYears)
+
+        # count separate supplemental uses: those more than a day after the last one counted
+        self.SuppUsesByYear = [0 for Y in range(numYears)]
+        suppHours = np.flatnonzero(suppUsed)
+        suppTimes = tHours[suppHours]
+        supplementalLastDate = np.datetime64(self.t_Data[0], 's')
+        oneDay = np.timedelta64(1, 'D')
+        i = 0
+        while True:
+            i += np.searchsorted(suppTimes[i:], supplementalLastDate + oneDay, side='right')
+            if i>=len(suppTimes):
+                break
+            supplementalLastDate = suppTimes[i]
+            self.SuppUsesByYear[years[suppHours[i]] - startYear] += 1
+
+        if self.BaselineAC != 0 and self.BaselineSEER>0:
+            self.BLAC_KWhByYear = yearTotals(cooling_required / self.BaselineSEER/1000., years, startYear, numYears)
+        else:
+            self.BLAC_KWhByYear = [0.0 for Y in range(numYears)]
+
+        HPAC = np.zeros(nHours)
+        if np_>0 and np.any(cooling_required > 0):
+            HPSEER = self.heatPumpSystem().WeightedSEER()
+            if HPSEER>0.:
+                cool = cooling_required > 0
+                HPAC[cool] = cooling_required[cool] / HPSEER/1000.
+        self.HPAC_KWhByYear = yearTotals(HPAC, years, startYear, numYears)
                                     
     def outputData(self,results):
         # This routine outputs all results to a text file
@@ -1424,4 +1947,8 @@ class HeatPumpAnalysis :
  
         output.write(results)
         output.close()
+
+        # the same results for other programs (see ResultsWriter.py)
+        if self.resultsWriter is not None and self.analysisSummary:
+            self.resultsWriter.writeAnalysis(self)
     
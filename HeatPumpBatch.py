@@ -0,0 +1,340 @@
+# Copyright (c) 2015 CSEC (Comprehensive Sustainable Energy Committee), Town of Concord
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Heat pump analysis of many homes from the command line, without the Tk user interface.
+#
+# Each delivery file (or every .txt file in a folder) is analyzed for the same heat pump selection and
+# scenario options, and the results for each home are written to a .json file in the output folder.
+#
+# examples:
+#   python HeatPumpBatch.py "Residential Profiles" --heatpump 10093446
+#   python HeatPumpBatch.py BB.txt MJ.txt --heatpump 10093446 --heatpump 10093446 --supplemental electric
+#
+# a heat pump is chosen by its AHRI certificate number; repeat --heatpump for each unit in the system
+#
+# with --screen N every heat pump in the listing is evaluated for each home as a single unit system, and
+# the N with the lowest heating cost are listed in the results (the heat pump selection is then optional):
+#   python HeatPumpBatch.py "Residential Profiles" --screen 10
+#
+# with --optimize N the best systems of up to N units, which meet the design heating load, are searched for
+# and listed (see HeatPumpAnalysis.optimizeHeatPumps); --minimal searches only the systems which need all of
+# their units to meet the load, much faster for 3 or more units:
+#   python HeatPumpBatch.py "Residential Profiles" --optimize 3 --ducting ductless --zones single --unit-cost 4000
+#
+# with --dataset FOLDER the results of every home are also appended to one set of CSV and JSON Lines files
+# (see ResultsWriter.py), written by the main process as each home is done:
+#   python HeatPumpBatch.py "Residential Profiles" --heatpump 10093446 --dataset "Output Data/dataset"
+#
+# with --hourly FOLDER the hourly series of each home (heat required, capacities, electricity, supplemental
+# heat) are written there as a compressed binary file, .npz or .parquet (see HourlyExport.py):
+#   python HeatPumpBatch.py "Residential Profiles" --heatpump 10093446 --hourly "Output Data/hourly"
+#
+# with --jobs N the homes are analyzed by N worker processes.  The heat pump catalog and selection are loaded
+# once and handed to each worker when it starts (inherited by fork, or pickled once per worker), and every home
+# uses that catalog rather than loading its own.  The climate data is read by every worker from the binary
+# climate cache files (memory mapped, see ClimateData.py), which are made before the workers start.
+
+import os
+import sys
+import json
+import argparse
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
+
+# no display is needed (or wanted) for a batch run
+os.environ.setdefault('MPLBACKEND', 'Agg')
+
+from HeatPumpAnalysis import *
+from ResultCache import ResultCache
+from ResultsWriter import ResultsWriter, analysisRows
+from HourlyExport import writeHourly, HOURLY_FORMATS, DEFAULT_FORMAT
+from time import perf_counter
+
+FUEL_TYPES = {'oil':HEAT_TYPE_OIL, 'gas':HEAT_TYPE_GAS, 'electric':HEAT_TYPE_ELEC, 'propane':HEAT_TYPE_LPG, 'none':HEAT_TYPE_OTHER}
+AC_TYPES = {'none':0, 'central':1, 'windows':2}     # as numbered on the Baseline Heating Options page
+
+def parseArgs(argv=None):
+    parser = argparse.ArgumentParser(description="Heat pump analysis of a set of homes from their fuel delivery records")
+    parser.add_argument('deliveries', nargs='+', help="fuel delivery files, or folders of them (all .txt files)")
+    parser.add_argument('-p', '--heatpump', action='append', default=[], metavar='AHRI',
+                        help="AHRI certificate number of a heat pump unit (repeat for each unit)")
+    parser.add_argument('-o', '--output', default=None,
+                        help="folder for the results files (default: Output Data)")
+    parser.add_argument('--supplemental', choices=sorted(FUEL_TYPES), default=None,
+                        help="supplemental heat (default: the baseline heating fuel)")
+    parser.add_argument('--supp-temp', type=float, default=None,
+                        help="outdoor temperature below which only the supplemental system heats")
+    parser.add_argument('--water', choices=['electric','gas','oil','propane'], default=None, help="baseline water heating fuel")
+    parser.add_argument('--hp-water-cop', type=float, default=None, help="COP of a heat pump water heater")
+    parser.add_argument('--baseline-ac', choices=sorted(AC_TYPES), default=None, help="baseline air conditioning")
+    parser.add_argument('--baseline-seer', type=float, default=None, help="SEER of the baseline air conditioning")
+    parser.add_argument('--winter-setpoint', type=float, default=None, help="heat pump heating set point (F)")
+    parser.add_argument('--summer-setpoint', type=float, default=None, help="heat pump cooling set point (F)")
+    parser.add_argument('--turn-on', default=None, metavar='MM-DD', help="start of the heating season")
+    parser.add_argument('--turn-off', default=None, metavar='MM-DD', help="end of the heating season")
+    for fuel in ('oil', 'gas', 'elec', 'lpg'):
+        parser.add_argument('--price-'+fuel, type=float, default=None, help="standard price per unit of "+fuel)
+    parser.add_argument('--screen', type=int, default=None, metavar='N',
+                        help="rank every heat pump in the listing for each home, keeping the N cheapest to heat with (0: all)")
+    parser.add_argument('--optimize', type=int, default=None, metavar='N',
+                        help="search for the best heat pump systems of up to N units for each home, among all those meeting "
+                             "the design heating load")
+    parser.add_argument('--minimal', action='store_true',
+                        help="--optimize only among the systems which need each of their units to meet the design load")
+    parser.add_argument('--ducting', choices=['ductless','ducted'], default=None, help="units considered by --optimize (default: all)")
+    parser.add_argument('--zones', choices=['single','multi'], default=None, help="units considered by --optimize (default: all)")
+    parser.add_argument('--objective', choices=['cost','coverage'], default='cost',
+                        help="--optimize for the lowest lifetime cost, or the largest share of the heating load from the heat pumps")
+    parser.add_argument('--unit-cost', type=float, default=0., help="installed cost per unit, for the lifetime cost")
+    parser.add_argument('--design-temp', type=float, default=None,
+                        help="design temperature (F) of --optimize (default: the 99%% design temperature of the period)")
+    parser.add_argument('--climate-fill', choices=['hold','linear'], default=None,
+                        help="fill gaps in the temperature readings with the reading after them (hold) or by interpolation "
+                             "(linear); the flag policy of ClimateData (NaN hours) only applies to its degree day index")
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help="number of worker processes (0: one per processor)")
+    parser.add_argument('--result-cache', default=None, metavar='FOLDER',
+                        help="keep results in this folder, and reuse them when a home is analyzed again with the same inputs")
+    parser.add_argument('--text', action='store_true', help="also append each results table to the Output Data text file")
+    parser.add_argument('--dataset', default=None, metavar='FOLDER',
+                        help="append the results of every home to CSV and JSON Lines files in this folder")
+    parser.add_argument('--hourly', default=None, metavar='FOLDER',
+                        help="write the hourly results of each home to a compressed file in FOLDER")
+    parser.add_argument('--hourly-format', choices=HOURLY_FORMATS, default=DEFAULT_FORMAT,
+                        help="file format of --hourly (default: %(default)s)")
+    parser.add_argument('-v', '--verbose', action='store_true', help="show the analysis progress messages")
+    return parser.parse_args(argv)
+
+def deliveryFiles(paths):
+    # the delivery files named, with folders expanded to the .txt files in them
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.lower().endswith('.txt') and not name.startswith('~'):
+                    files.append(os.path.join(path, name))
+        else:
+            files.append(path)
+    return [os.path.abspath(f) for f in files]
+
+def monthDay(text):
+    month, day = text.split('-')
+    return datetime.date(2015, int(month), int(day))
+
+def setScenario(hpa, args):
+    # scenario options which apply before the delivery file is read (fuel prices set the baseline cost)
+    for fuel in ('oil', 'gas', 'elec', 'lpg'):
+        price = getattr(args, 'price_'+fuel)
+        if price is not None:
+            setattr(hpa, 'STANDARD_PRICE_'+fuel.upper(), price)
+
+def setOptions(hpa, args, heatPumps):
+    # scenario options which apply after the delivery file has set the baseline heating system
+    if args.supplemental is not None:
+        hpa.SetSuppHeat(FUEL_TYPES[args.supplemental])
+    if args.supp_temp is not None:
+        hpa.SuppOutdoorTempNABL = args.supp_temp
+    if args.water is not None:
+        hpa.SetBLWScenario(FUEL_TYPES[args.water])
+    if args.hp_water_cop is not None:
+        hpa.HPWaterHeaterCOP = args.hp_water_cop
+    if args.baseline_ac is not None:
+        hpa.SetBLAScenario(AC_TYPES[args.baseline_ac])
+    if args.baseline_seer is not None:
+        hpa.BaselineSEER = args.baseline_seer
+    if args.winter_setpoint is not None:
+        hpa.WinterHPSetPoint = args.winter_setpoint
+    if args.summer_setpoint is not None:
+        hpa.SummerHPSetPoint = args.summer_setpoint
+    if args.turn_on is not None:
+        hpa.turn_ON_Date = monthDay(args.turn_on)
+    if args.turn_off is not None:
+        hpa.turn_OFF_Date = monthDay(args.turn_off)
+    if args.climate_fill is not None:
+        hpa.climateFill = args.climate_fill
+    hpa.HPChoice = list(heatPumps)
+    hpa.writeResultsFile = args.text
+    hpa.resultsWriter = None        # the dataset is written by saveRecord, in the main process
+    if args.result_cache is not None:
+        hpa.resultCache = ResultCache(folder=args.result_cache)
+
+def jsonValue(value):
+    # numpy numbers in the results
+    if hasattr(value, 'item'):
+        return value.item()
+    raise TypeError("%s is not JSON serializable" % type(value))
+
+def analyzeHome(filename, catalog, heatPumps, args):
+    # run the analysis for one delivery file, returning the results for the .json file
+    record = dict(file=filename, home=os.path.splitext(os.path.basename(filename))[0])
+
+    hpa = HeatPumpAnalysis()
+    setScenario(hpa, args)
+    if hpa.loadFuelDeliveries(filename) <= 0:
+        record['error'] = "No fuel deliveries read from "+filename
+        return record
+    setOptions(hpa, args, heatPumps)
+
+    if args.screen is not None or args.optimize is not None:
+        hpa.useCatalog(catalog)     # loaded once by main (or the worker)
+    if args.screen is not None:
+        screening = hpa.screenHeatPumps()
+        record['screening'] = screening[:args.screen] if args.screen>0 else screening
+    if args.optimize is not None:
+        ductless = None if args.ducting is None else args.ducting=='ductless'
+        record['systems'] = hpa.optimizeHeatPumps(maxUnits=args.optimize, ductless=ductless, zones=args.zones, objective=args.objective,
+                                                  designTemp=args.design_temp, unitCost=args.unit_cost, minimal=args.minimal)
+    if len(heatPumps)==0 and ('screening' in record or 'systems' in record):
+        return record
+
+    results = hpa.doHeatPumpAnalysis()
+    if not hpa.analysisSummary:
+        record['error'] = results
+        return record
+
+    record.update(header=hpa.fuelDeliveryHeader, baseHeatType=hpa.BaseHeatType, suppHeatType=hpa.SuppHeatType,
+                  numDeliveries=hpa.numDeliveries, firstDelivery=hpa.purchase_Date[0].isoformat(),
+                  lastDelivery=hpa.purchase_Date[-1].isoformat(), averageResistance=hpa.average_Resistance,
+                  heatPumps=[dict(AHRICertNumber=hp.AHRICertNumber, Manufacturer=hp.Manufacturer, Brand=hp.Brand,
+                                  OutdoorUnit=hp.OutdoorUnit, IndoorUnits=hp.IndoorUnits) for hp in heatPumps],
+                  settings=dict(WinterHPSetPoint=hpa.WinterHPSetPoint, SummerHPSetPoint=hpa.SummerHPSetPoint,
+                                turnOnDate=hpa.turn_ON_Date.strftime('%m-%d'), turnOffDate=hpa.turn_OFF_Date.strftime('%m-%d'),
+                                SuppOutdoorTempNABL=hpa.SuppOutdoorTempNABL, WaterHeatType=hpa.WaterHeatType,
+                                HPWaterHeaterCOP=hpa.HPWaterHeaterCOP, BaselineAC=hpa.BaselineAC, BaselineSEER=hpa.BaselineSEER,
+                                priceElectric=hpa.STANDARD_PRICE_ELEC, baseCostPerUnit=hpa.BaseCostPerUnit,
+                                suppCostPerUnit=hpa.SuppCostPerUnit),
+                  summary=hpa.analysisSummary, years=hpa.yearlyResults, referenceYears=hpa.referenceYearResults,
+                  results=results, run=hpa.runSummary)
+    if args.hourly is not None:
+        record['hourlyFile'] = writeHourly(hpa, args.hourly, record['home'], args.hourly_format)
+    if args.dataset is not None:
+        record['dataset'] = analysisRows(hpa, record['home'])
+    return record
+
+def runHome(filename, catalog, heatPumps, args):
+    # analyzeHome, with a failure recorded in the results rather than raised
+    start = perf_counter()
+    try:
+        record = analyzeHome(filename, catalog, heatPumps, args)
+    except Exception as e:
+        record = dict(file=filename, home=os.path.splitext(os.path.basename(filename))[0], error="%s: %s" % (type(e).__name__, e))
+    record['seconds'] = perf_counter()-start
+    return record
+
+# worker process state for a parallel run, set once per worker by initWorker
+workerCatalog = None
+workerHeatPumps = []
+workerArgs = None
+
+def initWorker(catalog, heatPumps, args):
+    global workerCatalog, workerHeatPumps, workerArgs
+    workerCatalog = catalog
+    workerHeatPumps = heatPumps
+    workerArgs = args
+    if not args.verbose:
+        sys.stdout = open(os.devnull, 'w')
+
+def workerHome(filename):
+    return runHome(filename, workerCatalog, workerHeatPumps, workerArgs)
+
+def saveRecord(record, outputFolder, dataset=None):
+    # write the .json results file for a home (and add it to the dataset) and report it, returning True if
+    # the analysis succeeded
+    rows = record.pop('dataset', None)
+    if dataset is not None and rows is not None:
+        dataset.write(*rows)
+    outputFile = os.path.join(outputFolder, record['home']+' results.json')
+    with open(outputFile, 'w') as output:
+        json.dump(record, output, indent=1, default=jsonValue)
+
+    if 'error' in record:
+        print("%s: %s" % (record['home'], record['error'].strip()))
+        return False
+    if 'summary' not in record:
+        if record.get('systems'):
+            best = record['systems'][0]
+            print("%s: best system %s, lifetime cost $%.0f, %.0f%% from the heat pumps (%.2fs) -> %s" % (record['home'], best['names'],
+                                                                                                     best['lifetimeCost'], best['coverage'], record['seconds'], outputFile))
+        elif record.get('screening'):
+            best = record['screening'][0]
+            print("%s: best %s-%s, heating cost $%.0f, %.0f%% from the heat pump (%.2fs) -> %s" % (record['home'], best['Brand'], best['OutdoorUnit'],
+                                                                                               best['cost'], best['coverage'], record['seconds'], outputFile))
+        else:
+            print("%s: no heat pump system found (%.2fs) -> %s" % (record['home'], record['seconds'], outputFile))
+        return True
+    summary = record['summary']
+    print("%s: %d-%d savings $%.0f, CO2 %.0f%% (%.2fs) -> %s" % (record['home'], summary['firstYear'], summary['lastYear'],
+                                                                summary['savings'], summary['CO2PercentImpact'], record['seconds'], outputFile))
+    return True
+
+def main(argv=None):
+    args = parseArgs(argv)
+    files = deliveryFiles(args.deliveries)
+    outputFolder = os.path.abspath(args.output) if args.output else None
+    if args.result_cache is not None:
+        args.result_cache = os.path.abspath(args.result_cache)
+    dataset = ResultsWriter(os.path.abspath(args.dataset)) if args.dataset else None
+    jobs = args.jobs if args.jobs>0 else os.cpu_count()
+
+    # the analysis finds its data files from the program folder
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    if outputFolder is None:
+        outputFolder = os.path.abspath('Output Data')
+    os.makedirs(outputFolder, exist_ok=True)
+
+    quiet = open(os.devnull, 'w')
+    with contextlib.redirect_stdout(sys.stdout if args.verbose else quiet):
+        catalog = HeatPumpAnalysis()
+        catalog.loadHeatPumps()
+
+    heatPumps = []
+    for number in args.heatpump:
+        heatPump = catalog.findHeatPump(number)
+        if heatPump is None:
+            print("No heat pump with AHRI certificate number "+number)
+            return 2
+        heatPumps.append(heatPump)
+
+    start = perf_counter()
+    failures = 0
+    if jobs>1 and len(files)>1:
+        # make any missing climate cache files now, rather than in several workers at once
+        with contextlib.redirect_stdout(sys.stdout if args.verbose else quiet):
+            ClimateData.prepareCache(catalog.workingDirectory + 'Climate Data', fill=args.climate_fill or 'hold')
+        with ProcessPoolExecutor(max_workers=jobs, initializer=initWorker, initargs=(catalog.catalog, heatPumps, args)) as pool:
+            for record in pool.map(workerHome, files):
+                if not saveRecord(record, outputFolder, dataset):
+                    failures += 1
+    else:
+        jobs = 1
+        for filename in files:
+            with contextlib.redirect_stdout(sys.stdout if args.verbose else quiet):
+                record = runHome(filename, catalog.catalog, heatPumps, args)
+            if not saveRecord(record, outputFolder, dataset):
+                failures += 1
+    quiet.close()
+
+    elapsed = perf_counter()-start
+    print("%d homes in %.1fs (%.2f homes/s, %d process%s), %d failed" % (len(files), elapsed, len(files)/elapsed if elapsed>0 else 0.,
+                                                                      jobs, "es" if jobs>1 else "", failures))
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,291 @@
+# Benchmark of the heat pump analysis on synthetic homes and climate
+#
+# Synthetic hourly climate (Mesowest .csv files, as in Climate Data) and a synthetic home (a fuel delivery
+# file, as in Residential Profiles) are made in a scratch folder for each size asked for, 1-50 years of
+# results and 1-10 units in HPChoice, and the analysis is timed by stage (the stages of runStages, the results table
+# and the reference years, from the run summary - see RunStats.py).  The first run of a size parses the .csv
+# files (cold); the repeats find the climate in memory, as later analyses of a session do (warm).  The timings are written as JSON, to be
+# compared between commits.
+#
+# Every benchmark also checks the per-year heat pump KWh and supplemental fuel of a few small runs against
+# a frozen reference run (BENCHMARK_REFERENCE), for both hourly engines.  The synthetic data depend only on
+# the seed, so the reference stays valid until the analysis changes; --freeze writes it again.
+#
+# examples:
+#   python HeatPumpBenchmark.py --years 1 10 50 --units 1 3 10 --repeat 3 -o benchmark.json
+#   python HeatPumpBenchmark.py --check
+#   python HeatPumpBenchmark.py --freeze
+
+import os
+import sys
+import json
+import math
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+import contextlib
+import datetime
+
+# no display is needed (or wanted) for a benchmark
+os.environ.setdefault('MPLBACKEND', 'Agg')
+
+import numpy as np
+
+from HeatPumpAnalysis import HeatPumpAnalysis
+import ClimateData
+
+# first year of the synthetic climate (the analysis reads no earlier year).  It has a single delivery, in
+# December, as the first year of deliveries is left out of the results: the results are for the years after.
+START_YEAR = 2002
+MAX_YEARS = 50
+MAX_UNITS = 10
+STATION = 'KBED'
+BENCHMARK_REFERENCE = os.path.join('Benchmark', 'reference.json')
+REFERENCE_RUNS = ((3, 1), (3, 3))       # (years, units) of the runs checked against the reference
+REFERENCE_TOLERANCE = 1e-9              # relative; the engines differ by rounding for several units
+
+def yearTemperatures(year, seed):
+    # hourly temperatures (F) of a synthetic year: a seasonal and a daily cycle, and weather as a random
+    # walk pulled back to the cycles.  Each year depends only on the seed and the year.
+    rng = random.Random(seed*10000 + year)
+    hours = (datetime.date(year+1, 1, 1) - datetime.date(year, 1, 1)).days * 24
+    weather = 0.
+    temps = []
+    for hour in range(hours):
+        day = hour/24.
+        weather = 0.97*weather + rng.uniform(-2., 2.)
+        temp = 50. - 22.*math.cos(2.*math.pi*(day-20.)/365.25) - 8.*math.cos(2.*math.pi*(hour % 24 - 3.)/24.) + weather
+        temps.append(round(temp, 1))
+    return temps
+
+def writeClimateFile(folder, year, temps):
+    # a Mesowest .csv file: 8 header lines, then a reading 54 minutes into each hour (UTC), starting with the
+    # last hour of the year before so that the first hour of the year has a reading at or after it
+    filename = os.path.join(folder, "%s-%d.csv" % (STATION, year))
+    lines = ["# STATION: %s" % STATION, "# STATION NAME: Synthetic benchmark station", "# LATITUDE: 42.46811",
+             "# LONGITUDE: -71.29463", "# ELEVATION [ft]: 132", "# STATE: MA",
+             "Station_ID,Date_Time,air_temp_set_1", ",,Fahrenheit",
+             "%s,12/31/%d 23:54 UTC,%.1f" % (STATION, year-1, temps[0])]
+    time = datetime.datetime(year, 1, 1, 0, 54)
+    oneHour = datetime.timedelta(hours=1)
+    for temp in temps:
+        lines.append("%s,%s UTC,%.1f" % (STATION, time.strftime("%m/%d/%Y %H:%M"), temp))
+        time += oneHour
+    with open(filename, 'w', encoding='latin-1') as output:
+        output.write("\n".join(lines) + "\n")
+    return filename
+
+def writeDeliveryFile(filename, years, climate, seed, gallonsPerDegreeDay=0.16):
+    # a fuel oil delivery file in the Residential Profiles format: a delivery about every month of the
+    # heating season (and one at the end of the summer), the gallons used since the delivery before, from
+    # the heating degree days (base 65F) of the synthetic climate, and a price rising over the years
+    rng = random.Random(seed)
+    lines = ["Synthetic home, %d years of oil deliveries." % years, "Heat source: Fuel Oil", "Year\tDate\t$$\tGallons"]
+    lastHour = 0
+    for Y in range(years+1):
+        year = START_YEAR + Y
+        if Y==0:
+            dates = [datetime.date(year, 12, 15)]
+        else:
+            dates = [datetime.date(year, month, rng.randint(5, 25)) for month in (1, 2, 3, 4, 9, 11, 12)]
+            dates.append(datetime.date(year, 12, 31))
+        for n, delivery in enumerate(dates):
+            hour = (delivery - datetime.date(START_YEAR, 1, 1)).days*24
+            degreeDays = sum(max(65.-temp, 0.) for temp in climate[lastHour:hour])/24.
+            lastHour = hour
+            gallons = round(max(gallonsPerDegreeDay*degreeDays*rng.uniform(0.9, 1.1), 20.), 1)
+            price = 2.50 + 0.05*Y
+            lines.append("%s\t%d/%d/%02d\t$%.2f\t%.1f" % (str(year) if n==0 else "", delivery.month, delivery.day, year % 100,
+                                                          gallons*price, gallons))
+    with open(filename, 'w', encoding='latin-1') as output:
+        output.write("\n".join(lines) + "\n")
+    return filename
+
+def makeData(folder, years, seed):
+    # the synthetic climate and home for a number of years of results, in folder (as the working directory of the analysis)
+    climateFolder = os.path.join(folder, 'Climate Data')
+    homeFolder = os.path.join(folder, 'Residential Profiles')
+    os.makedirs(climateFolder, exist_ok=True)
+    os.makedirs(homeFolder, exist_ok=True)
+    climate = []        # hourly from Jan 1 of START_YEAR
+    for year in range(START_YEAR, START_YEAR+years+1):
+        temps = yearTemperatures(year, seed)
+        filename = os.path.join(climateFolder, "%s-%d.csv" % (STATION, year))
+        if not os.path.exists(filename):
+            writeClimateFile(climateFolder, year, temps)
+        climate += temps
+    return writeDeliveryFile(os.path.join(homeFolder, "Synthetic %d years.txt" % years), years, climate, seed)
+
+def benchmarkUnits(catalog, numUnits):
+    # the first numUnits units of the listing with all three standard rating points
+    units = []
+    for hp in catalog.HPList:
+        points = [hp.CAPMin[:3], hp.CAPMax[:3], hp.COPMin[:3], hp.COPMax[:3]]
+        if len(hp.tData)>=3 and all(np.all(np.isfinite(p)) and np.all(p>0) for p in points):
+            units.append(hp)
+            if len(units)==numUnits:
+                break
+    return units
+
+def runAnalysis(catalog, folder, deliveryFile, units, arrayEngine=True):
+    # one analysis of the synthetic home, returning the analysis
+    hpa = HeatPumpAnalysis()
+    hpa.workingDirectory = folder + os.sep
+    hpa.catalog = catalog.catalog
+    hpa.HPList = catalog.HPList
+    hpa.writeResultsFile = False
+    hpa.resultCache = None
+    hpa.arrayEngine = arrayEngine
+    hpa.loadFuelDeliveries(deliveryFile)
+    hpa.HPChoice = list(units)
+    hpa.doHeatPumpAnalysis()
+    return hpa
+
+def forgetClimate(folder):
+    # make the next analysis read the .csv files again: no binary cache files, nothing in memory
+    shutil.rmtree(os.path.join(folder, 'Climate Data', ClimateData.CACHE_FOLDER), ignore_errors=True)
+    ClimateData.yearStore.clear()
+    ClimateData.degreeDays.clear()
+
+def timeRuns(catalog, folder, years, numUnits, repeat, arrayEngine, seed):
+    deliveryFile = makeData(folder, years, seed)
+    units = benchmarkUnits(catalog, numUnits)
+    forgetClimate(folder)
+    runs = [runAnalysis(catalog, folder, deliveryFile, units, arrayEngine).runSummary for i in range(repeat+1)]
+
+    cold, warm = runs[0], runs[1:]
+    stages = {}
+    for stage in cold['stages']:
+        times = sorted(run['stages'][stage]['wallSeconds'] for run in warm if stage in run['stages'])
+        stages[stage] = dict(cold=cold['stages'][stage]['wallSeconds'],
+                             best=times[0] if times else None, median=times[len(times)//2] if times else None)
+    totals = sorted(run['wallSeconds'] for run in warm)
+    return dict(years=years, units=numUnits, engine='array' if arrayEngine else 'scalar', repeat=repeat,
+                AHRICertNumbers=[hp.AHRICertNumber for hp in units], stages=stages,
+                total=dict(cold=cold['wallSeconds'], best=totals[0] if totals else None, median=totals[len(totals)//2] if totals else None),
+                counters=warm[-1]['counters'] if warm else cold['counters'])
+
+def referenceResults(catalog, folder, seed, arrayEngine=True):
+    # per-year heat pump KWh and supplemental units of the reference runs
+    results = []
+    for years, numUnits in REFERENCE_RUNS:
+        deliveryFile = makeData(folder, years, seed)
+        units = benchmarkUnits(catalog, numUnits)
+        hpa = runAnalysis(catalog, folder, deliveryFile, units, arrayEngine)
+        results.append(dict(years=years, units=numUnits, AHRICertNumbers=[hp.AHRICertNumber for hp in units],
+                            yearly=[dict(year=r['year'], heatPumpKWh=r['heatPumpKWh'], suppUnits=r['suppUnits']) for r in hpa.yearlyResults]))
+    return results
+
+def checkReference(catalog, folder, seed):
+    # compare the runs of both engines with the frozen reference, returning a list of the differences found
+    with open(BENCHMARK_REFERENCE) as input:
+        reference = json.load(input)
+    if reference['seed'] != seed:
+        return ["the reference was made with seed %d" % reference['seed']]
+    problems = []
+    for engine in ('array', 'scalar'):
+        results = referenceResults(catalog, folder, seed, engine=='array')
+        for expected, result in zip(reference['runs'], results):
+            name = "%s engine, %d years, %d units" % (engine, expected['years'], expected['units'])
+            if result['AHRICertNumbers'] != expected['AHRICertNumbers']:
+                problems.append("%s: units %s, expected %s" % (name, result['AHRICertNumbers'], expected['AHRICertNumbers']))
+                continue
+            if len(result['yearly']) != len(expected['yearly']):
+                problems.append("%s: %d years of results, expected %d" % (name, len(result['yearly']), len(expected['yearly'])))
+                continue
+            for row, expectedRow in zip(result['yearly'], expected['yearly']):
+                for key in ('year', 'heatPumpKWh', 'suppUnits'):
+                    if not math.isclose(row[key], expectedRow[key], rel_tol=REFERENCE_TOLERANCE, abs_tol=1e-9):
+                        problems.append("%s, %d: %s %r, expected %r" % (name, expectedRow['year'], key, row[key], expectedRow[key]))
+    return problems
+
+def gitCommit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def sizeList(low, high):
+    def check(text):
+        value = int(text)
+        if not low <= value <= high:
+            raise argparse.ArgumentTypeError("%d is not from %d to %d" % (value, low, high))
+        return value
+    return check
+
+def parseArgs(argv=None):
+    parser = argparse.ArgumentParser(description="Time the heat pump analysis on synthetic homes and climate")
+    parser.add_argument('--years', type=sizeList(1, MAX_YEARS), nargs='+', default=[1, 10],
+                        help="years of synthetic climate and deliveries (1-%d)" % MAX_YEARS)
+    parser.add_argument('--units', type=sizeList(1, MAX_UNITS), nargs='+', default=[1, 3],
+                        help="numbers of heat pump units in the system (1-%d)" % MAX_UNITS)
+    parser.add_argument('--engine', choices=['array', 'scalar', 'both'], default='array', help="hourly engine timed")
+    parser.add_argument('--repeat', type=int, default=3, help="warm runs of each size, after the cold run")
+    parser.add_argument('--seed', type=int, default=1, help="seed of the synthetic data")
+    parser.add_argument('--data', default=None, metavar='FOLDER',
+                        help="folder for the synthetic data, kept for later runs (default: a temporary folder)")
+    parser.add_argument('-o', '--output', default=None, help="JSON file for the timings (default: print them)")
+    parser.add_argument('--check', action='store_true', help="only check the results against the frozen reference")
+    parser.add_argument('--freeze', action='store_true', help="write the frozen reference from this version")
+    parser.add_argument('-v', '--verbose', action='store_true', help="show the analysis progress messages")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parseArgs(argv)
+    output = os.path.abspath(args.output) if args.output else None
+    folder = os.path.abspath(args.data) if args.data else tempfile.mkdtemp(prefix='hpat-benchmark-')
+
+    # the analysis finds the heat pump listing from the program folder
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    quiet = open(os.devnull, 'w')
+    verbose = sys.stdout if args.verbose else quiet
+    try:
+        with contextlib.redirect_stdout(verbose):
+            catalog = HeatPumpAnalysis()
+            catalog.loadHeatPumps()
+
+        if args.freeze:
+            with contextlib.redirect_stdout(verbose):
+                runs = referenceResults(catalog, folder, args.seed)
+            os.makedirs(os.path.dirname(BENCHMARK_REFERENCE), exist_ok=True)
+            with open(BENCHMARK_REFERENCE, 'w') as reference:
+                json.dump(dict(seed=args.seed, commit=gitCommit(), runs=runs), reference, indent=1)
+            print("Reference results written to "+BENCHMARK_REFERENCE)
+            return 0
+
+        report = dict(commit=gitCommit(), date=datetime.datetime.now().isoformat(timespec='seconds'), python=platform.python_version(),
+                      numpy=np.__version__, machine=platform.machine(), seed=args.seed, runs=[])
+        if not args.check:
+            engines = [True, False] if args.engine=='both' else [args.engine=='array']
+            for years in args.years:
+                for numUnits in args.units:
+                    for arrayEngine in engines:
+                        with contextlib.redirect_stdout(verbose):
+                            run = timeRuns(catalog, folder, years, numUnits, args.repeat, arrayEngine, args.seed)
+                        report['runs'].append(run)
+                        print("%2d years, %2d units, %s engine: cold %.3fs, warm %s" % (years, numUnits, run['engine'], run['total']['cold'],
+                              "%.3fs" % run['total']['best'] if run['total']['best'] is not None else "-"))
+
+        with contextlib.redirect_stdout(verbose):
+            problems = checkReference(catalog, folder, args.seed)
+        report['check'] = dict(passed=len(problems)==0, problems=problems)
+        for problem in problems:
+            print(problem)
+        print("Reference check %s" % ("passed" if not problems else "FAILED (%d differences)" % len(problems)))
+
+        if output is not None:
+            with open(output, 'w') as results:
+                json.dump(report, results, indent=1)
+        elif not args.check:
+            print(json.dumps(report, indent=1))
+        return 0 if not problems else 1
+    finally:
+        quiet.close()
+        if args.data is None:
+            shutil.rmtree(folder, ignore_errors=True)
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,386 @@
+# The NEEP Cold Climate Air-Source Heat Pump Specification Listing, parsed once into arrays
+#
+# loadCatalog reads the tab-delimited listing (HEAT_PUMP_FILE_NAME) into a struct of arrays: the rating
+# points of every unit in (units, points) arrays, and each text column as a table of its distinct strings
+# with a code per unit.  The result is saved in a binary cache file named by the hash of the listing, so a
+# later start loads it in a few milliseconds, and any change to the listing is parsed again.
+#
+# HeatPumpCatalog holds these arrays for the program, and a HeatPump for each unit which reads its row.
+#
+# The columns are read at fixed positions, so the header row of the listing is checked against the layout
+# below first: a NEEP release with a different layout raises CatalogLayoutError rather than being misread.
+
+import os
+import sys
+import glob
+import hashlib
+
+import numpy as np
+
+from HeatPump import HeatPump
+
+DEG = '\xa1'    # the degree sign, as the listing's (Mac) encoding reads in latin-1
+
+# text columns: HeatPump attribute, column, header
+TEXT_COLUMNS = (('Manufacturer', 0, 'Manufacturer'),
+                ('Brand', 1, '"Brand (if applicable)"'),
+                ('ModelName', 2, 'Model Name'),
+                ('AHRICertNumber', 3, 'AHRI Certificate No.'),
+                ('OutdoorUnit', 4, 'Outdoor Unit Model'),
+                ('IndoorUnits', 5, 'Indoor Unit Model(s)'),
+                ('AHRIType', 6, 'AHRI Type'),
+                ('HSPFregIV', 7, 'HSPF (Region IV):'),
+                ('SEER', 8, 'SEER'),
+                ('EER_95', 9, 'EER (@ 95'+DEG+'F)'),
+                ('CoolingCapacity', 10, 'Cooling Capacity (Btuh)'),
+                ('EnergyStar', 11, 'ENERGY STAR Certified'),
+                ('DuctedDuctless', 12, 'Ductless or Centrally Ducted'),
+                ('Zones', 13, '"If Ductless, Multi-zone or Single-zone?"'),
+                ('DuctlessIndoorType', 14, 'Ductless Indoor Type'))
+
+# rating points: temperature, first column (minimum capacity); the maximum capacity, COP at minimum and COP at
+# maximum capacity follow at +2, +6 and +8.  The last point is optional, at the temperature in column 53.
+RATING_TEMPERATURES = (47, 17, 5)
+RATING_COLUMNS = (16, 26, 36)
+OPTIONAL_TEMP_COLUMN = 53
+OPTIONAL_COLUMN = 54
+NUM_POINTS = len(RATING_TEMPERATURES)+1
+
+def ratingHeaders(column, temp):
+    return ((column, 'Minimum Capacity %s%sF' % (temp, DEG)), (column+2, 'Maximum Capacity %s%sF' % (temp, DEG)),
+            (column+6, 'COP at Min. Capacity %s%sF' % (temp, DEG)), (column+8, 'COP at Max. Capacity %s%sF' % (temp, DEG)))
+
+# every column read, with the header the listing of 7.14.17 has for it
+LAYOUT = tuple((column, header) for name, column, header in TEXT_COLUMNS)
+for _temp, _column in zip(RATING_TEMPERATURES, RATING_COLUMNS):
+    LAYOUT += ratingHeaders(_column, _temp)
+LAYOUT += ((OPTIONAL_TEMP_COLUMN, 'Outdoor Dry Bulb ('+DEG+'F)'),
+           (OPTIONAL_COLUMN, 'Minimum Capactity X'+DEG+'F'),      # sic
+           (OPTIONAL_COLUMN+2, 'Maximum Capacity X'+DEG+'F'),
+           (OPTIONAL_COLUMN+6, 'COP at Min. Capacity X'+DEG+'F'),
+           (OPTIONAL_COLUMN+8, 'COP at Max. Capacity X'+DEG+'F'))
+
+CACHE_FOLDER = 'cache'
+CACHE_VERSION = 2
+LAYOUT_FINGERPRINT = hashlib.sha256(repr((CACHE_VERSION, LAYOUT, NUM_POINTS)).encode('utf-8')).hexdigest()[:16]
+
+CAPACITY_BAND = 12000.     # BTU/hr (one ton), the width of the capacity bands of HeatPumpCatalog.query
+
+class CatalogLayoutError(Exception):
+    """The heat pump listing does not have the columns this program reads"""
+
+def tF(stringvar):
+    # value of a number column (-1 when empty, -99 for a spreadsheet division by zero)
+    if len(stringvar)==0:
+        return -1.0
+    if stringvar=="#DIV/0!":
+        return -99.0
+    return float((stringvar.replace(',','')).replace('"',''))
+
+def normalizedText(text):
+    # lower case without spaces and hyphens, so that the variants in the listing ('Single-zone', 'Single-Zone',
+    # 'Singlezone', 'Ductless  ', 'ductless', 'Carrier ') are the same
+    return text.lower().replace(' ','').replace('-','')
+
+def textNumber(text):
+    try:
+        return tF(text)
+    except ValueError:
+        return np.nan
+
+def checkLayout(filename, tokens):
+    # raise CatalogLayoutError unless the header row has the expected header in every column read
+    wrong = []
+    for column, header in LAYOUT:
+        found = tokens[column] if column<len(tokens) else None
+        if found != header:
+            wrong.append("column %d: expected %r, found %r" % (column, header, found))
+    if wrong:
+        raise CatalogLayoutError("Heat pump listing %s has a different column layout than expected:\n  %s"
+                                 % (filename, "\n  ".join(wrong)))
+
+def parseCatalog(filename):
+    # read the listing into arrays (see loadCatalog)
+    input = open(filename,'r', encoding='latin-1')
+    test = input.read()
+    lines = test.split('\n')
+    input.close()
+
+    # Skip ahead to the line which starts "Manufacturer"
+    LN = 0      # step through data starting at first line
+    while True:
+        if LN==len(lines):
+            raise CatalogLayoutError("Heat pump listing %s has no header row starting 'Manufacturer'" % filename)
+        tokens = lines[LN].split('\t')
+        LN +=1
+        if (tokens[0]=='Manufacturer'):
+            break
+    checkLayout(filename, tokens)
+
+    texts = [[] for column in TEXT_COLUMNS]
+    ratings = []
+    # ' Load Heat Pump Data
+    while LN<len(lines):
+        tokens = lines[LN].split('\t')
+        LN += 1
+
+        if tokens[0]=='':
+            break
+        if len(tokens)<50 :
+            continue
+
+        try:
+            # minimum and maximum capacity and COP at each rating point
+            rating = np.full((4, NUM_POINTS), np.nan)
+            for p, column in enumerate(RATING_COLUMNS):
+                rating[:, p] = [tF(tokens[column]), tF(tokens[column+2]), tF(tokens[column+6]), tF(tokens[column+8])]
+            temps = list(RATING_TEMPERATURES) + [np.nan]
+
+            C2 = OPTIONAL_TEMP_COLUMN
+            if (len(tokens[C2])>0) & (tokens[C2] != 'N/A'):
+                temps[-1] = tF(tokens[C2])
+                capMin = tF(tokens[C2+1])
+                capMax = tF(tokens[C2+3])
+                copMin = tF(tokens[C2+7])
+                copMax = tF(tokens[C2+9])
+                if capMin<0. :
+                    capMin = capMax
+                    copMin = copMax
+                rating[:, -1] = [capMin, capMax, copMin, copMax]
+        except Exception as e:
+            print(e)
+            continue
+
+        for i, (name, column, header) in enumerate(TEXT_COLUMNS):
+            texts[i].append(tokens[column])
+        ratings.append((temps, rating))
+
+    n = len(ratings)
+    catalog = {'tData': np.array([temps for temps, rating in ratings]).reshape(n, NUM_POINTS)}
+    rating = np.array([rating for temps, rating in ratings]).reshape(n, 4, NUM_POINTS)
+    for i, name in enumerate(('CAPMin', 'CAPMax', 'COPMin', 'COPMax')):
+        catalog[name] = rating[:, i, :]
+    catalog['valid'] = ~np.isnan(catalog['tData'])
+
+    # each text column as a table of distinct strings and a code per unit
+    for i, (name, column, header) in enumerate(TEXT_COLUMNS):
+        table, codes = np.unique(np.array(texts[i], dtype=str), return_inverse=True)
+        catalog[name+'Table'] = table
+        catalog[name] = codes.astype(np.min_scalar_type(len(table)))
+    return catalog
+
+def cacheFileName(filename, digest):
+    folder, name = os.path.split(filename)
+    return os.path.join(folder, CACHE_FOLDER, "%s-%s.npz" % (os.path.splitext(name)[0], digest[:16]))
+
+def loadCatalog(filename):
+    # The listing as a dict of arrays: tData, CAPMin, CAPMax, COPMin, COPMax (units x points, the optional
+    # last point NaN where a unit has none), valid (units x points), and for each text column in TEXT_COLUMNS,
+    # <name>Table (distinct strings) and <name> (code of each unit in the table)
+    with open(filename, 'rb') as input:
+        digest = hashlib.sha256(input.read()).hexdigest()
+    cacheFile = cacheFileName(filename, digest)
+    if os.path.exists(cacheFile):
+        try:
+            with np.load(cacheFile) as data:
+                if str(data['layout']) == LAYOUT_FINGERPRINT:
+                    return {name: data[name] for name in data.files if name != 'layout'}
+        except Exception as e:
+            print("Unable to read heat pump catalog cache %s: %s" % (cacheFile, e))
+
+    catalog = parseCatalog(filename)
+    saveCatalog(filename, cacheFile, catalog)
+    return catalog
+
+def saveCatalog(filename, cacheFile, catalog):
+    folder = os.path.dirname(cacheFile)
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    try:
+        os.makedirs(folder, exist_ok=True)
+        # remove cache files of earlier versions of the listing
+        for old in glob.glob(os.path.join(glob.escape(folder), glob.escape(stem) + '-*.npz')):
+            os.remove(old)
+        tmpFile = cacheFile + '.%d.tmp' % os.getpid()
+        with open(tmpFile, 'wb') as output:
+            np.savez(output, layout=np.array(LAYOUT_FINGERPRINT), **catalog)
+        os.replace(tmpFile, cacheFile)
+    except OSError as e:
+        print("Unable to write heat pump catalog cache %s: %s" % (cacheFile, e))
+
+class HeatPumpCatalog:
+    """The heat pump listing as arrays, one row per unit, with a HeatPump view of each row (units)"""
+    def __init__(self, data):
+        # data: the dict of arrays from loadCatalog
+        self.tData = data['tData']
+        self.CAPMin = data['CAPMin']
+        self.CAPMax = data['CAPMax']
+        self.COPMin = data['COPMin']
+        self.COPMax = data['COPMax']
+        self.valid = data['valid']
+        # the optional point is the last, so the valid points of a unit are the first numPoints
+        self.numPoints = self.valid.sum(axis=1).tolist()
+
+        # text columns: the distinct strings (interned, so equal values share one string) and each unit's code
+        self.textTables = {}
+        self.textCodes = {}
+        for name, column, header in TEXT_COLUMNS:
+            self.textTables[name] = [sys.intern(str(s)) for s in data[name+'Table']]
+            self.textCodes[name] = data[name]
+
+        self.units = [HeatPump(self, i) for i in range(len(self.tData))]
+        self.indexes = None     # see buildIndexes
+        self.searchPairs = None     # see buildSearch
+
+    @classmethod
+    def load(cls, filename):
+        return cls(loadCatalog(filename))
+
+    def __getstate__(self):
+        # pickled as the arrays only (for worker processes); the units are made again, without their tables
+        data = {name: getattr(self, name) for name in ('tData', 'CAPMin', 'CAPMax', 'COPMin', 'COPMax', 'valid')}
+        for name, column, header in TEXT_COLUMNS:
+            data[name+'Table'] = np.array(self.textTables[name], dtype=str)
+            data[name] = self.textCodes[name]
+        return data
+
+    def __setstate__(self, data):
+        self.__init__(data)
+
+    def __len__(self):
+        return len(self.units)
+
+    def __getitem__(self, i):
+        return self.units[i]
+
+    def __iter__(self):
+        return iter(self.units)
+
+    def text(self, name, i):
+        return self.textTables[name][self.textCodes[name][i]]
+
+    def column(self, name):
+        # a text column of every unit, as an array
+        return np.array(self.textTables[name])[self.textCodes[name]]
+
+    def normalized(self, name):
+        # a text column of every unit as its index keys (see normalizedText)
+        table = np.array([normalizedText(s) for s in self.textTables[name]])
+        return table[self.textCodes[name]]
+
+    def number(self, name):
+        # a number column given as text (HSPFregIV, SEER, ...) of every unit, NaN where it is not a number
+        table = np.array([textNumber(s) for s in self.textTables[name]])
+        return table[self.textCodes[name]]
+
+    def buildIndexes(self):
+        # For query: a mask of the units with each key of the indexed columns, and the order of the units by each
+        # range column.  Made at the first query, in a few milliseconds.
+        zones = np.char.replace(self.normalized('Zones'), 'zone', '')
+        ducting = np.where(self.normalized('DuctedDuctless') == 'ductless', 'ductless', 'ducted')
+        capacityBand = (self.CAPMax[:, 0] // CAPACITY_BAND).astype(int)
+        keys = dict(manufacturer=self.normalized('Manufacturer'), brand=self.normalized('Brand'), ducting=ducting,
+                    zones=zones, ahriType=self.normalized('AHRIType'), capacityBand=capacityBand)
+        self.indexes = {}
+        for name, column in keys.items():
+            values, inverse = np.unique(column, return_inverse=True)
+            self.indexes[name] = {value: inverse == i for i, value in enumerate(values.tolist())}
+
+        self.ranges = {}
+        columns = dict(hspf=self.number('HSPFregIV'), seer=self.number('SEER'),
+                       capacity5=self.CAPMax[:, RATING_TEMPERATURES.index(5)])
+        for name, column in columns.items():
+            order = np.argsort(column, kind='stable')       # NaN last
+            self.ranges[name] = (column[order], order)
+
+    def query(self, manufacturer=None, brand=None, ductless=None, zones=None, ahriType=None, capacityBand=None,
+              hspf=None, seer=None, capacity5=None, text=None):
+        # Rows of the units meeting every condition given:
+        #   manufacturer, brand, ahriType: the name (case, spaces and hyphens ignored)
+        #   ductless: True for ductless units, False for ducted ones; zones: 'single' or 'multi'
+        #   capacityBand: n for a maximum capacity at 47F of n to n+1 tons (CAPACITY_BAND)
+        #   hspf, seer, capacity5 (maximum capacity at 5F): a (low, high) range, inclusive, either may be None
+        #   text: a string found in the brand, manufacturer, model, outdoor or indoor unit or AHRI number
+        if self.indexes is None:
+            self.buildIndexes()
+        keep = np.ones(len(self.units), dtype=bool)
+        for name, value in (('manufacturer', manufacturer), ('brand', brand), ('zones', zones), ('ahriType', ahriType)):
+            if value is not None:
+                keep &= self.indexes[name].get(normalizedText(value), False)
+        if ductless is not None:
+            keep &= self.indexes['ducting'].get('ductless' if ductless else 'ducted', False)
+        if capacityBand is not None:
+            keep &= self.indexes['capacityBand'].get(int(capacityBand), False)
+
+        for name, bounds in (('hspf', hspf), ('seer', seer), ('capacity5', capacity5)):
+            if bounds is not None:
+                values, order = self.ranges[name]
+                low, high = bounds
+                lo = 0 if low is None else np.searchsorted(values, low, side='left')
+                hi = np.searchsorted(values, np.inf if high is None else high, side='right')
+                inRange = np.zeros(len(self.units), dtype=bool)
+                inRange[order[lo:hi]] = True
+                keep &= inRange
+
+        if text:
+            keep &= self.search(text.lower())
+        return np.flatnonzero(keep)
+
+    def buildSearch(self):
+        # For query(text=...), made at the first search: the text searched (brand, manufacturer, model, outdoor
+        # and indoor units and AHRI number) of each unit, and the units in which each letter and pair of letters
+        # is found
+        names = ('Brand', 'Manufacturer', 'ModelName', 'OutdoorUnit', 'IndoorUnits', 'AHRICertNumber')
+        self.searchText = [' '.join(t).lower() for t in zip(*[self.column(name).tolist() for name in names])]
+        pairs = {}
+        for i, line in enumerate(self.searchText):
+            for pair in set(line) | set(line[j:j+2] for j in range(len(line)-1)):
+                pairs.setdefault(pair, []).append(i)
+        self.searchPairs = {pair: np.array(rows) for pair, rows in pairs.items()}
+
+    def search(self, text):
+        # mask of the units whose search text contains text: the units with the rarest of its letter pairs (or
+        # with its letter, for one letter), checked for the whole text
+        if self.searchPairs is None:
+            self.buildSearch()
+        matches = np.zeros(len(self.units), dtype=bool)
+        if len(text)==1:
+            rows = self.searchPairs.get(text, [])
+        else:
+            rows = min((self.searchPairs.get(text[j:j+2], []) for j in range(len(text)-1)), key=len)
+            if len(text)>2:
+                rows = [i for i in rows if text in self.searchText[i]]
+        matches[rows] = True
+        return matches
+
+    def distinctRatings(self, rows):
+        # rows with distinct rating points: the first of the units listed with the same ratings (such as the same
+        # equipment sold under two brands)
+        ratings = np.concatenate([self.tData[rows], self.CAPMin[rows], self.CAPMax[rows], self.COPMin[rows], self.COPMax[rows]], axis=1)
+        distinct, first = np.unique(np.nan_to_num(ratings, nan=np.inf), axis=0, return_index=True)
+        return np.asarray(rows)[np.sort(first)]
+
+    def ratings(self, name, i):
+        # the valid rating points of unit i (tData, CAPMin, CAPMax, COPMin or COPMax)
+        return getattr(self, name)[i, :self.numPoints[i]]
+
+    def performanceTables(self, temps, units=None):
+        # HeatPump.PerformanceTable for many units at once: a (4, units, len(temps)) array with MaxCapacity,
+        # MinCapacity, COPatMaxCapacity and COPatMinCapacity of each unit (all units, or the rows in units) at
+        # each temperature, interpolated as in interpolateCurve
+        rows = np.arange(len(self.tData)) if units is None else np.asarray(units, dtype=int)
+        temps = np.asarray(temps, dtype=float)[np.newaxis, :]
+        tData = self.tData[rows]
+        curves = np.array([self.CAPMax[rows], self.CAPMin[rows], self.COPMax[rows], self.COPMin[rows]])
+        lastPoint = self.valid[rows].sum(axis=1) - 1
+
+        table = np.zeros((4, len(rows), temps.shape[1]))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for i in reversed(range(NUM_POINTS-1)):
+                # NaN for a missing optional point, so no temperature falls in its interval
+                seg = (temps > tData[:, i+1:i+2]) & (temps <= tData[:, i:i+1])
+                frac = (temps-tData[:, i:i+1])/(tData[:, i+1:i+2] - tData[:, i:i+1])
+                table = np.where(seg, curves[:, :, i:i+1] + frac * (curves[:, :, i+1:i+2] - curves[:, :, i:i+1]), table)
+        coldest = np.arange(len(rows)), lastPoint
+        table = np.where(temps <= tData[coldest][:, np.newaxis], curves[:, coldest[0], coldest[1]][:, :, np.newaxis], table)
+        table = np.where(temps > tData[:, 0:1], curves[:, :, 0:1], table)
+        return table
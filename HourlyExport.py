@@ -0,0 +1,71 @@
+# Hourly results of an analysis as a compressed binary file
+#
+# doHeatPumpAnalysis keeps the hourly series of the analysis period (timeArray, Q_required, ...) only for the
+# graph.  writeHourly saves them, one file per run, so load shapes can be studied for many homes without
+# running the analysis again:
+#   time                seconds since 1970-01-01 of each hour (int64; the local time of the climate data)
+#   Q_required          heat required (BTU)
+#   QC_required         cooling required (BTU)
+#   capacity_Max        maximum heat pump capacity (BTU/hr) at the outdoor temperature of the hour, in every
+#                       hour of the year, in and out of the heating season (0 with no heat pump chosen)
+#   capacity_Min        minimum heat pump capacity (BTU/hr), likewise
+#   electric_Required   heat pump electricity (KWh)
+#   supplemental_Heat   heat from the supplemental system (BTU)
+# with the home and heat pumps of the run as text.
+#
+# The file is a compressed NumPy archive (.npz), or a Parquet file (.parquet) when pyarrow is installed;
+# both store each series as a column of its own type, and are read back by readHourly, e.g.
+#   hourly = readHourly('Output Data/hourly/BB hourly.npz')
+#   times = hourly['time'].astype('datetime64[s]')
+
+import os
+import numpy as np
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+HOURLY_SERIES = ('Q_required', 'QC_required', 'capacity_Max', 'capacity_Min', 'electric_Required', 'supplemental_Heat')
+HOURLY_FORMATS = ('npz', 'parquet')
+DEFAULT_FORMAT = 'parquet' if pyarrow is not None else 'npz'
+
+def hourlyColumns(hpa):
+    # the hourly series of the last analysis of hpa (a HeatPumpAnalysis), as arrays
+    columns = dict(time=np.asarray(hpa.timeArray, dtype='datetime64[s]').astype(np.int64))
+    for name in HOURLY_SERIES:
+        columns[name] = np.asarray(getattr(hpa, name), dtype=float)
+    return columns
+
+def hourlyInfo(hpa, home=None):
+    return dict(home=home if home is not None else hpa.fuelDeliveryHeader.split('\t')[0].strip(),
+                heatPumps="+".join(hp.Brand+'-'+hp.OutdoorUnit for hp in hpa.HPChoice),
+                AHRICertNumbers="+".join(hp.AHRICertNumber for hp in hpa.HPChoice))
+
+def writeHourly(hpa, folder, name, format=None):
+    # write the hourly series of hpa to <folder>/<name> hourly.npz (or .parquet), returning the file name
+    format = format or DEFAULT_FORMAT
+    if format == 'parquet' and pyarrow is None:
+        print("pyarrow is not installed, writing the hourly results as .npz")
+        format = 'npz'
+    columns = hourlyColumns(hpa)
+    info = hourlyInfo(hpa, name)
+    filename = os.path.join(folder, name + ' hourly.' + format)
+    os.makedirs(folder, exist_ok=True)
+    if format == 'parquet':
+        table = pyarrow.table(columns).replace_schema_metadata(info)
+        pyarrow.parquet.write_table(table, filename, compression='zstd')
+    else:
+        np.savez_compressed(filename, **columns, **{key: np.array(value) for key, value in info.items()})
+    return filename
+
+def readHourly(filename):
+    # the columns (and text) of a file written by writeHourly, as a dict
+    if filename.endswith('.parquet'):
+        table = pyarrow.parquet.read_table(filename)
+        hourly = {name: table.column(name).to_numpy() for name in table.column_names}
+        hourly.update((key.decode(), value.decode()) for key, value in (table.schema.metadata or {}).items())
+        return hourly
+    with np.load(filename) as archive:
+        return {name: archive[name] if archive[name].ndim else archive[name].item() for name in archive.files}
@@ -0,0 +1,87 @@
+# Analysis results stored by a hash of the analysis inputs
+#
+# doHeatPumpAnalysis looks up the key of its inputs (the delivery data, fuel and water heating settings,
+# set points, season dates, the chosen heat pumps and the climate files) before doing any work, so that
+# an analysis repeated with unchanged inputs returns the stored results at once.  The most recently used
+# results are kept in memory; with a folder given, every result is also saved there (one pickle file
+# per key) and found again by later sessions.
+
+import os
+import pickle
+import hashlib
+from collections import OrderedDict
+
+import numpy as np
+
+RESULT_CACHE_VERSION = 2    # change when the analysis changes, so older stored results are not used
+
+def resultKey(*inputs):
+    # hash of the repr of the inputs (floats repr exactly, so any change of value changes the key)
+    text = repr((RESULT_CACHE_VERSION,) + inputs)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def copyResult(value):
+    # copy of a result value, so later changes to the analysis attributes do not alter the stored copy
+    if isinstance(value, np.ndarray):
+        return value.copy()
+    if isinstance(value, dict):
+        return {k: copyResult(v) for k, v in value.items()}
+    if isinstance(value, list):
+        if len(value)>0 and isinstance(value[0], (list, dict, np.ndarray)):
+            return [copyResult(v) for v in value]
+        return list(value)      # numbers or dates
+    return value
+
+class ResultCache:
+    def __init__(self, maxEntries=8, folder=None):
+        self.maxEntries = maxEntries
+        self.folder = folder        # optional folder for the on-disk copies
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def fileName(self, key):
+        return os.path.join(self.folder, key + '.pkl')
+
+    def get(self, key):
+        # stored results for key, or None
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+        elif self.folder is not None and os.path.exists(self.fileName(key)):
+            try:
+                with open(self.fileName(key), 'rb') as input:
+                    entry = pickle.load(input)
+                self.remember(key, entry)
+            except Exception as e:
+                print("Unable to read stored results %s: %s" % (self.fileName(key), e))
+                entry = None
+
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return copyResult(entry)
+
+    def put(self, key, entry):
+        entry = copyResult(entry)
+        self.remember(key, entry)
+        if self.folder is not None:
+            try:
+                os.makedirs(self.folder, exist_ok=True)
+                tmpFile = self.fileName(key) + '.%d.tmp' % os.getpid()
+                with open(tmpFile, 'wb') as output:
+                    pickle.dump(entry, output, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmpFile, self.fileName(key))
+            except OSError as e:
+                print("Unable to save results %s: %s" % (self.fileName(key), e))
+
+    def remember(self, key, entry):
+        # keep in memory, dropping the least recently used results beyond maxEntries
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries)>self.maxEntries:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
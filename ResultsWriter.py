@@ -0,0 +1,101 @@
+# Analysis results as a dataset: CSV and JSON Lines files, appended run by run
+#
+# The results table of doHeatPumpAnalysis is text, written for reading (outputData).  ResultsWriter appends
+# the same results to files for other programs, one run at a time, without reading or rewriting what the
+# files hold, so a batch of any number of homes makes one dataset in bounded memory:
+#   <name> runs.csv     a row per run: what was analyzed (home, heat pumps, fuels, settings) and the summary
+#   <name> years.csv    a row per year of each run: the rows of yearlyResults, and the emissions of each part
+#   <name>.jsonl        a line per run: the run row, with its years as a list
+# The runs and years tables share the run's runId.  The columns are fixed (RUN_COLUMNS, YEAR_COLUMNS), and the
+# header is written when a file is started; a value which does not apply to a run (e.g. the air conditioning
+# of a home without) is empty in the CSV files and null in the JSON lines.
+
+import os
+import csv
+import json
+import uuid
+import datetime
+
+RUN_COLUMNS = ('runId', 'date', 'home', 'heatPumps', 'AHRICertNumbers', 'baseHeatType', 'suppHeatType', 'waterHeatType',
+               'HPWaterHeaterCOP', 'BaselineAC', 'BaselineSEER', 'WinterHPSetPoint', 'SummerHPSetPoint', 'turnOnDate',
+               'turnOffDate', 'SuppOutdoorTempNABL', 'priceElectric', 'baseCostPerUnit', 'suppCostPerUnit',
+               'averageResistance', 'firstYear', 'lastYear', 'savings', 'CO2PercentImpact')
+
+# the keys of the yearlyResults rows, then the emissions (kg CO2) of each
+RESULT_COLUMNS = ('year', 'baseUnits', 'baseCost', 'waterUnits', 'waterCost', 'baselineACKWh', 'baselineACCost',
+                  'heatPumpKWh', 'heatPumpCost', 'COP', 'hpWaterKWh', 'hpWaterCost', 'suppUses', 'suppUnits',
+                  'suppCost', 'heatPumpACKWh', 'heatPumpACCost')
+EMISSION_COLUMNS = ('baseKgCO2', 'waterKgCO2', 'baselineACKgCO2', 'heatPumpKgCO2', 'hpWaterKgCO2', 'suppKgCO2', 'heatPumpACKgCO2')
+YEAR_COLUMNS = ('runId',) + RESULT_COLUMNS + EMISSION_COLUMNS
+
+def plainValue(value):
+    # numpy numbers as Python numbers, dates as ISO text
+    if hasattr(value, 'item'):
+        return value.item()
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return value
+
+def emissions(units, kgCO2PerUnit):
+    return None if units is None else units*kgCO2PerUnit
+
+def analysisRows(hpa, home=None):
+    # the run row and year rows of the last analysis of hpa (a HeatPumpAnalysis)
+    summary = hpa.analysisSummary
+    run = dict(runId=uuid.uuid4().hex, date=datetime.datetime.now().isoformat(timespec='seconds'),
+               home=home if home is not None else hpa.fuelDeliveryHeader.split('\t')[0].strip(),
+               heatPumps="+".join(hp.Brand+'-'+hp.OutdoorUnit for hp in hpa.HPChoice),
+               AHRICertNumbers="+".join(hp.AHRICertNumber for hp in hpa.HPChoice),
+               baseHeatType=hpa.BaseHeatType, suppHeatType=hpa.SuppHeatType, waterHeatType=hpa.WaterHeatType,
+               HPWaterHeaterCOP=hpa.HPWaterHeaterCOP, BaselineAC=hpa.BaselineAC, BaselineSEER=hpa.BaselineSEER,
+               WinterHPSetPoint=hpa.WinterHPSetPoint, SummerHPSetPoint=hpa.SummerHPSetPoint,
+               turnOnDate=hpa.turn_ON_Date.strftime('%m-%d'), turnOffDate=hpa.turn_OFF_Date.strftime('%m-%d'),
+               SuppOutdoorTempNABL=hpa.SuppOutdoorTempNABL, priceElectric=hpa.STANDARD_PRICE_ELEC,
+               baseCostPerUnit=hpa.BaseCostPerUnit, suppCostPerUnit=hpa.SuppCostPerUnit,
+               averageResistance=hpa.average_Resistance, firstYear=summary.get('firstYear'), lastYear=summary.get('lastYear'),
+               savings=summary.get('savings'), CO2PercentImpact=summary.get('CO2PercentImpact'))
+
+    years = []
+    for yearResult in hpa.yearlyResults:
+        row = dict(runId=run['runId'])
+        row.update((key, yearResult.get(key)) for key in RESULT_COLUMNS)
+        row.update(baseKgCO2=emissions(yearResult['baseUnits'], hpa.BaseKgCO2PerUnit),
+                   waterKgCO2=emissions(yearResult['waterUnits'], hpa.WaterKgCO2PerUnit),
+                   baselineACKgCO2=emissions(yearResult['baselineACKWh'], hpa.ElecKgCO2PerUnit),
+                   heatPumpKgCO2=emissions(yearResult['heatPumpKWh'], hpa.ElecKgCO2PerUnit),
+                   hpWaterKgCO2=emissions(yearResult['hpWaterKWh'], hpa.ElecKgCO2PerUnit),
+                   suppKgCO2=emissions(yearResult['suppUnits'], hpa.SuppKgCO2PerUnit),
+                   heatPumpACKgCO2=emissions(yearResult['heatPumpACKWh'], hpa.ElecKgCO2PerUnit))
+        years.append(row)
+    return run, years
+
+class ResultsWriter:
+    def __init__(self, folder, name='Heat Pump Analysis'):
+        self.folder = folder
+        self.runsFile = os.path.join(folder, name + ' runs.csv')
+        self.yearsFile = os.path.join(folder, name + ' years.csv')
+        self.jsonFile = os.path.join(folder, name + '.jsonl')
+
+    def appendCSV(self, filename, columns, rows):
+        with open(filename, 'a', newline='', encoding='utf-8') as output:
+            writer = csv.writer(output)
+            if output.tell() == 0:
+                writer.writerow(columns)
+            for row in rows:
+                writer.writerow(['' if row.get(column) is None else plainValue(row[column]) for column in columns])
+
+    def write(self, run, years):
+        # append a run and its years to the dataset
+        try:
+            os.makedirs(self.folder, exist_ok=True)
+            self.appendCSV(self.runsFile, RUN_COLUMNS, [run])
+            self.appendCSV(self.yearsFile, YEAR_COLUMNS, years)
+            record = {column: run.get(column) for column in RUN_COLUMNS}
+            record['years'] = [{column: row.get(column) for column in YEAR_COLUMNS[1:]} for row in years]
+            with open(self.jsonFile, 'a', encoding='utf-8') as output:
+                output.write(json.dumps(record, default=plainValue) + '\n')
+        except OSError as e:
+            print("Unable to write results to %s: %s" % (self.folder, e))
+
+    def writeAnalysis(self, hpa, home=None):
+        self.write(*analysisRows(hpa, home))
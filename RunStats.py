@@ -0,0 +1,107 @@
+# Timing, counters and profiling of an analysis run
+#
+# doHeatPumpAnalysis keeps a RunStats for each run.  Its stages are timed as laps - lap(name) ends the stage
+# running and starts the next - in wall clock and CPU time (of the thread running the analysis, so a run in
+# the UI worker thread is measured alone), and the counters below are taken as their change over the run.
+# finish() returns the run summary, a dict of plain values, and appends it as a line of JSON to the file
+# named by the environment variable HPAT_RUN_SUMMARY, when set, so runs can be followed in production logs.
+#
+# The environment variable HPAT_PROFILE adds a profile of the run to the summary:
+#   HPAT_PROFILE=cpu         cProfile: the functions taking the most time
+#   HPAT_PROFILE=memory      tracemalloc: peak traced memory and the lines allocating the most
+#   HPAT_PROFILE=cpu,memory  both
+#
+# counters: counts of work done in this process, incremented where the work is done, e.g.
+#   RunStats.counters['climateFilesParsed'] += 1
+
+import os
+import io
+import json
+import time
+import datetime
+import cProfile
+import pstats
+import tracemalloc
+from collections import Counter
+
+RUN_SUMMARY_VARIABLE = 'HPAT_RUN_SUMMARY'
+PROFILE_VARIABLE = 'HPAT_PROFILE'
+PROFILE_TOP = 25            # functions (or lines allocating memory) listed in the profile of a run
+
+counters = Counter()
+
+class RunStats:
+    def __init__(self, run='analysis'):
+        self.run = run
+        self.info = {}              # description of the run, added to the summary
+        self.stages = {}            # stage name -> [wall seconds, CPU seconds, number of laps]
+        self.current = None
+        self.outcome = 'completed'
+        self.profile = None
+        self.tracing = False
+        self.startCounters = Counter(counters)
+        self.startTime = datetime.datetime.now()
+        self.wall = self.lapWall = time.perf_counter()
+        self.cpu = self.lapCPU = time.thread_time()
+
+    def start(self):
+        # profile the run from here to finish, as asked for by HPAT_PROFILE
+        options = os.environ.get(PROFILE_VARIABLE, '').lower().split(',')
+        if 'cpu' in options:
+            self.profile = cProfile.Profile()
+            try:
+                self.profile.enable()
+            except ValueError as e:
+                # another profiler is active
+                print("Unable to profile the run: %s" % e)
+                self.profile = None
+        self.tracing = 'memory' in options and not tracemalloc.is_tracing()
+        if self.tracing:
+            tracemalloc.start()
+
+    def lap(self, stage=None):
+        # end the stage running (if any), and start stage
+        wall = time.perf_counter()
+        cpu = time.thread_time()
+        if self.current is not None:
+            times = self.stages.setdefault(self.current, [0., 0., 0])
+            times[0] += wall - self.lapWall
+            times[1] += cpu - self.lapCPU
+            times[2] += 1
+        self.current = stage
+        self.lapWall = wall
+        self.lapCPU = cpu
+
+    def finish(self):
+        self.lap()
+        summary = dict(run=self.run, start=self.startTime.isoformat(timespec='seconds'), outcome=self.outcome,
+                       wallSeconds=time.perf_counter() - self.wall, cpuSeconds=time.thread_time() - self.cpu)
+        summary.update(self.info)
+        summary['stages'] = {stage: dict(wallSeconds=wall, cpuSeconds=cpu, laps=laps)
+                             for stage, (wall, cpu, laps) in self.stages.items()}
+        summary['counters'] = {name: counters[name] - self.startCounters[name]
+                               for name in sorted(counters) if counters[name] != self.startCounters[name]}
+
+        if self.profile is not None:
+            self.profile.disable()
+            stats = pstats.Stats(self.profile, stream=io.StringIO())
+            rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:PROFILE_TOP]
+            summary['profile'] = [dict(function="%s:%d(%s)" % key, calls=calls, totalSeconds=total, cumulativeSeconds=cumulative)
+                                  for key, (primitive, calls, total, cumulative, callers) in rows]
+            self.profile = None
+        if self.tracing:
+            current, peak = tracemalloc.get_traced_memory()
+            top = tracemalloc.take_snapshot().statistics('lineno')[:PROFILE_TOP]
+            tracemalloc.stop()
+            summary['memory'] = dict(peakBytes=peak, top=[dict(line=str(stat.traceback), bytes=stat.size, blocks=stat.count)
+                                                          for stat in top])
+            self.tracing = False
+
+        summaryFile = os.environ.get(RUN_SUMMARY_VARIABLE)
+        if summaryFile:
+            try:
+                with open(summaryFile, 'a') as output:
+                    output.write(json.dumps(summary) + '\n')
+            except OSError as e:
+                print("Unable to write the run summary to %s: %s" % (summaryFile, e))
+        return summary
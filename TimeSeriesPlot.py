@@ -0,0 +1,67 @@
+# Hourly time series plotted at the resolution of the screen
+#
+# A multi-year analysis has over 100,000 hours, far more points than the plot has pixel columns, and drawing
+# them all makes redraws and pan/zoom on the graph page slow.  DecimatedLines keeps the full series and
+# gives each Line2D only the minimum and maximum of each pixel column of the visible time range (envelope),
+# in time order, so the plot looks the same as the full series (every peak and trough is kept) with a few
+# thousand points.  The envelope is recomputed when the time range changes (pan, zoom, or new data), by
+# set_data on the same lines rather than clearing the axes and plotting again.
+
+import numpy as np
+import matplotlib.dates as mdates
+
+def envelope(x, y, x0, x1, columns):
+    # the points of (x, y) (x sorted) from x0 to x1 - and the one beyond each end, so the line reaches the
+    # edges - reduced to the first minimum and maximum of each of columns equal bins of x, in time order
+    first = max(np.searchsorted(x, x0, side='left') - 1, 0)
+    last = min(np.searchsorted(x, x1, side='right') + 1, len(x))
+    x = x[first:last]
+    y = y[first:last]
+    if len(x) <= 2*columns:
+        return x, y
+
+    bins = np.minimum(((x - x[0]) * (columns / (x[-1] - x[0]))).astype(int), columns-1)
+    starts = np.flatnonzero(np.diff(bins, prepend=-1))       # first point of each non-empty bin
+    counts = np.diff(np.append(starts, len(x)))
+    binIndex = np.repeat(np.arange(len(starts)), counts)
+    index = np.arange(len(x))
+
+    # fmin/fmax ignore missing (NaN) values; a bin with only missing values keeps its first point
+    lows = np.fmin.reduceat(y, starts)
+    highs = np.fmax.reduceat(y, starts)
+    iLow = np.minimum.reduceat(np.where(y == lows[binIndex], index, len(x)), starts)
+    iHigh = np.minimum.reduceat(np.where(y == highs[binIndex], index, len(x)), starts)
+    iLow = np.where(iLow == len(x), starts, iLow)
+    iHigh = np.where(iHigh == len(x), starts, iHigh)
+
+    points = np.sort(np.stack([iLow, iHigh], axis=1), axis=1).ravel()
+    return x[points], y[points]
+
+class DecimatedLines:
+    """Lines on a date axis, each drawn from the min/max envelope of its series over the visible range"""
+    def __init__(self, axes, styles):
+        # styles: (format, label) of each line, as for axes.plot
+        self.axes = axes
+        self.lines = [axes.plot([], [], fmt, label=label)[0] for fmt, label in styles]
+        self.x = np.zeros(0)
+        self.series = [np.zeros(0) for line in self.lines]
+        axes.xaxis_date()
+        axes.callbacks.connect('xlim_changed', lambda ax: self.redraw())
+
+    def setData(self, times, series):
+        # times (datetimes) and a series of values for each line; the view is reset to the whole range
+        self.x = mdates.date2num(np.asarray(times, dtype='datetime64[s]'))
+        self.series = [np.asarray(values, dtype=float) for values in series]
+        if len(self.x) > 1:
+            self.axes.set_xlim(self.x[0], self.x[-1])     # redraws (xlim_changed)
+        else:
+            self.redraw()
+        self.axes.relim()
+        self.axes.autoscale_view(scalex=False)
+
+    def redraw(self):
+        x0, x1 = self.axes.get_xlim()
+        columns = max(int(self.axes.bbox.width), 100)
+        for line, values in zip(self.lines, self.series):
+            line.set_data(*envelope(self.x, values, x0, x1, columns))
+        # the canvas is drawn by whatever changed the limits (the toolbar, or animate after setData)
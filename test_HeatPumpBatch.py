@@ -0,0 +1,24 @@
+# Batch runs of the heat pump analysis (python3 -m pytest)
+
+import os
+import json
+
+import HeatPumpBatch
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def runBatch(monkeypatch, tmp_path, *options):
+    # analyze BB.txt with the options, returning the exit status and the results of the home
+    monkeypatch.chdir(HERE)
+    status = HeatPumpBatch.main([os.path.join('Residential Profiles', 'BB.txt'), '-o', str(tmp_path)] + list(options))
+    with open(os.path.join(str(tmp_path), 'BB results.json')) as results:
+        return status, json.load(results)
+
+def test_supplemental_only(monkeypatch, tmp_path):
+    # a change of supplemental heating, with no heat pump selected
+    status, record = runBatch(monkeypatch, tmp_path, '--supplemental', 'electric')
+    assert status == 0
+    assert 'error' not in record
+    assert record['summary']['suppHeatType'] == 'Electric Resistance'
+    assert "Analysis of supplemental heat system change to Electric Resistance" in record['results']
+    assert len(record['years']) > 0